@@ -0,0 +1,30 @@
+"""
+add user tenant.
+
+Revision ID: 3f9c2a7d1e04
+Revises: b55441f3a712
+Create Date: 2026-10-19 10:12:31.518204
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c2a7d1e04"
+down_revision: str | Sequence[str] | None = "b55441f3a712"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("users", sa.Column("tenant", sa.String(length=60), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "tenant")
@@ -0,0 +1,33 @@
+"""
+add user is_admin.
+
+Revision ID: 5b2e8f14a9c3
+Revises: c7a5d93f2b18
+Create Date: 2026-10-20 09:41:17.365082
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5b2e8f14a9c3"
+down_revision: str | Sequence[str] | None = "c7a5d93f2b18"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "users",
+        sa.Column("is_admin", sa.Boolean(), server_default=sa.false(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "is_admin")
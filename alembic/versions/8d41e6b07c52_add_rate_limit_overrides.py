@@ -0,0 +1,46 @@
+"""
+add rate limit overrides.
+
+Revision ID: 8d41e6b07c52
+Revises: 3f9c2a7d1e04
+Create Date: 2026-10-19 11:03:57.204816
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d41e6b07c52"
+down_revision: str | Sequence[str] | None = "3f9c2a7d1e04"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("users", sa.Column("plan", sa.String(length=30), nullable=True))
+    op.create_table(
+        "rate_limit_overrides",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("user_id", sa.UUID(), nullable=True),
+        sa.Column("plan", sa.String(length=30), nullable=True),
+        sa.Column("limit", sa.Integer(), nullable=False),
+        sa.Column("window_seconds", sa.Integer(), nullable=False),
+        sa.CheckConstraint(
+            "(user_id IS NULL) <> (plan IS NULL)", name="override_user_xor_plan"
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("plan"),
+        sa.UniqueConstraint("user_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("rate_limit_overrides")
+    op.drop_column("users", "plan")
@@ -0,0 +1,57 @@
+"""
+add rate limit decisions.
+
+Revision ID: c7a5d93f2b18
+Revises: 8d41e6b07c52
+Create Date: 2026-10-19 13:26:08.771349
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c7a5d93f2b18"
+down_revision: str | Sequence[str] | None = "8d41e6b07c52"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "rate_limit_decisions",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("key", sa.String(length=200), nullable=False),
+        sa.Column("decision", sa.String(length=16), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("limit", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_rate_limit_decisions_created_at"),
+        "rate_limit_decisions",
+        ["created_at"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_rate_limit_decisions_key"),
+        "rate_limit_decisions",
+        ["key"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        op.f("ix_rate_limit_decisions_key"), table_name="rate_limit_decisions"
+    )
+    op.drop_index(
+        op.f("ix_rate_limit_decisions_created_at"), table_name="rate_limit_decisions"
+    )
+    op.drop_table("rate_limit_decisions")
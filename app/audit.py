@@ -0,0 +1,132 @@
+import logging
+import random
+import threading
+from collections import deque
+from datetime import UTC, datetime
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import RateLimitDecision
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BUFFER_SIZE = 10_000
+AUDIT_BATCH_SIZE = 1_000
+AUDIT_FLUSH_SECONDS = 1.0
+ALLOWED_SAMPLE_RATE = 0.01
+NEAR_LIMIT_RATIO = 0.8
+
+
+class AuditLog:
+    """
+    Bounded write-behind buffer of limiter decisions.
+
+    Requests only append to a deque; a background thread drains it into
+    rate_limit_decisions with one multi-row INSERT per batch. When the
+    buffer is full new entries are dropped and counted rather than
+    blocking the request.
+    """
+
+    def __init__(
+        self,
+        capacity: int = AUDIT_BUFFER_SIZE,
+        sample_rate: float = ALLOWED_SAMPLE_RATE,
+        near_limit_ratio: float = NEAR_LIMIT_RATIO,
+    ):
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.near_limit_ratio = near_limit_ratio
+        self.dropped = 0
+        self._buffer: deque[dict] = deque()
+
+    def record(
+        self, key: str, count: int, limit: int, decision: str | None = None
+    ) -> None:
+        """
+        Record a decision for `key` at `count` out of `limit`.
+
+        Guards rejecting for a reason other than the request count pass
+        that reason as `decision`; those are always kept.
+        """
+        if decision is None:
+            headroom = max(1, round(limit * (1 - self.near_limit_ratio)))
+            if count > limit:
+                decision = "limited"
+            elif count > 1 and limit - count <= headroom:
+                decision = "near_limit"
+            elif random.random() < self.sample_rate:
+                decision = "allowed"
+            else:
+                return
+
+        if len(self._buffer) >= self.capacity:
+            self.dropped += 1
+            return
+        self._buffer.append(
+            {
+                "created_at": datetime.now(UTC),
+                "key": key,
+                "decision": decision,
+                "count": count,
+                "limit": limit,
+            }
+        )
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def flush(
+        self, session_factory: sessionmaker, batch_size: int = AUDIT_BATCH_SIZE
+    ) -> int:
+        """Write up to `batch_size` buffered decisions. Returns how many were taken."""
+        rows = []
+        while self._buffer and len(rows) < batch_size:
+            rows.append(self._buffer.popleft())
+        if not rows:
+            return 0
+        try:
+            with session_factory() as session, session.begin():
+                session.execute(insert(RateLimitDecision), rows)
+        except Exception:
+            logger.exception("Failed to write %d audit rows", len(rows))
+            self.dropped += len(rows)
+        return len(rows)
+
+    def render_metrics(self) -> str:
+        return (
+            "# TYPE audit_buffered_decisions gauge\n"
+            f"audit_buffered_decisions {len(self)}\n"
+            "# TYPE audit_dropped_decisions_total counter\n"
+            f"audit_dropped_decisions_total {self.dropped}\n"
+        )
+
+
+audit_log = AuditLog()
+
+
+def run_audit_writer(
+    session_factory: sessionmaker,
+    stop: threading.Event,
+    log: AuditLog = audit_log,
+) -> None:
+    while not stop.wait(AUDIT_FLUSH_SECONDS):
+        while log.flush(session_factory) == AUDIT_BATCH_SIZE:
+            pass
+    while log.flush(session_factory):
+        pass
+
+
+def start_audit_writer(
+    session_factory: sessionmaker,
+    stop: threading.Event,
+    log: AuditLog = audit_log,
+) -> threading.Thread:
+    thread = threading.Thread(
+        target=run_audit_writer,
+        args=(session_factory, stop, log),
+        name="rate-limit-audit",
+        daemon=True,
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from uuid import uuid4
+
+from sqlalchemy import Select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db.models import User, hash_password
+from app.schema import UserBatchResult, UserCreate
+
+HASH_WORKERS = os.cpu_count() or 1
+INSERT_CHUNK_SIZE = 1000
+
+hash_pool: ProcessPoolExecutor | None = None
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    # spawn, not fork: the app runs background threads that fork would copy
+    global hash_pool
+    if hash_pool is None:
+        hash_pool = ProcessPoolExecutor(
+            max_workers=HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    global hash_pool
+    if hash_pool is not None:
+        hash_pool.shutdown()
+        hash_pool = None
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    chunksize = max(1, len(passwords) // (HASH_WORKERS * 4))
+    return list(get_hash_pool().map(hash_password, passwords, chunksize=chunksize))
+
+
+def _insert(session: Session):
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(User)
+    return postgresql.insert(User)
+
+
+def bulk_create_users(
+    session_factory: sessionmaker[Session], users_in: list[UserCreate]
+) -> list[UserBatchResult]:
+    """
+    Create many users with one hashing fan-out and multi-row inserts.
+
+    Usernames that already exist, or repeat earlier in the batch, are
+    reported as conflicts and never hashed. Rows lost to a concurrent
+    insert are caught by ON CONFLICT DO NOTHING and reported the same way.
+
+    No transaction is open while the pool hashes: the conflict check and
+    the insert each run in a short transaction of their own.
+    """
+    usernames = [user.username for user in users_in]
+    with session_factory() as session:
+        stmt = Select(User.username).where(User.username.in_(set(usernames)))
+        taken = set(session.execute(stmt).scalars())
+
+    pending = {}
+    for user in users_in:
+        if user.username not in taken and user.username not in pending:
+            pending[user.username] = user
+    hashes = hash_passwords([user.password for user in pending.values()])
+    rows = [
+        {
+            "id": uuid4(),
+            "name": user.name,
+            "username": user.username,
+            "hashed_password": hashed,
+        }
+        for user, hashed in zip(pending.values(), hashes)
+    ]
+
+    created = {}
+    with session_factory() as session, session.begin():
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            stmt = (
+                _insert(session)
+                .values(rows[start : start + INSERT_CHUNK_SIZE])
+                .on_conflict_do_nothing(index_elements=["username"])
+                .returning(User.username, User.id)
+            )
+            created.update(session.execute(stmt).all())
+
+    results = []
+    for username in usernames:
+        user_id = created.pop(username, None)
+        if user_id is None:
+            results.append(UserBatchResult(username=username, status="conflict"))
+        else:
+            results.append(
+                UserBatchResult(username=username, status="created", id=user_id)
+            )
+    return results
@@ -5,6 +5,12 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     REDIS_PORT: int = 6379
     REDIS_HOST: str = "localhost"
+    ADAPTIVE_LOAD_SHEDDING: bool = False
+    REQUEST_TRACING: bool = False
+    # host:port for UDP gossip, unique per process: run one worker per
+    # address (e.g. uvicorn --workers 1), since the address is the node id
+    CRDT_BIND: str | None = None
+    CRDT_PEERS: list[str] = []
 
 
 settings = Settings()
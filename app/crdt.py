@@ -0,0 +1,287 @@
+import errno
+import json
+import logging
+import socket
+import threading
+import time
+from collections.abc import Callable
+from typing import Protocol
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+GOSSIP_INTERVAL_SECONDS = 0.1
+# Entries per datagram, keeping each well under the UDP payload limit
+UDP_DELTA_ENTRIES = 200
+
+# A delta is a list of (key, window index, sender's own count) entries
+Delta = list[tuple[str, int, int]]
+Handler = Callable[[str, Delta], None]
+
+
+class GCounter:
+    """
+    Grow-only counter with one slot per node. Merging takes the max of
+    each slot, so applying the same or an older delta twice is harmless.
+    """
+
+    def __init__(self):
+        self.counts: dict[str, int] = {}
+        self.total = 0
+
+    def increment(self, node_id: str, amount: int = 1) -> None:
+        self.counts[node_id] = self.counts.get(node_id, 0) + amount
+        self.total += amount
+
+    def merge(self, node_id: str, count: int) -> None:
+        current = self.counts.get(node_id, 0)
+        if count > current:
+            self.counts[node_id] = count
+            self.total += count - current
+
+
+class Transport(Protocol):
+    def register(self, node_id: str, handler: Handler) -> None: ...
+
+    def peers(self, node_id: str) -> list[str]: ...
+
+    def send(self, sender: str, peer: str, delta: Delta) -> None: ...
+
+
+class InProcessTransport:
+    """Delivers deltas by direct call. For tests and single-process setups."""
+
+    def __init__(self):
+        self.handlers: dict[str, Handler] = {}
+
+    def register(self, node_id: str, handler: Handler) -> None:
+        self.handlers[node_id] = handler
+
+    def peers(self, node_id: str) -> list[str]:
+        return [peer for peer in self.handlers if peer != node_id]
+
+    def send(self, sender: str, peer: str, delta: Delta) -> None:
+        self.handlers[peer](sender, delta)
+
+
+class UdpTransport:
+    """
+    Exchanges deltas with peers as JSON datagrams over UDP.
+
+    A lost datagram is not resent, but each delta carries the sender's
+    absolute count for a slot, so its next admission on that slot
+    repairs the peer's view.
+
+    Datagrams are only accepted from configured peers, and the sender is
+    named after the peer's configured address rather than anything in
+    the payload, so an outside host cannot inject counts.
+    """
+
+    def __init__(self, bind: str, peers: list[str] | None = None):
+        host, port = bind.rsplit(":", 1)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.sock.bind((host, int(port)))
+        except OSError:
+            self.sock.close()
+            raise
+        self.sock.settimeout(0.5)
+        self.peer_addresses: dict[str, tuple[str, int]] = {}
+        self._peer_names: dict[tuple[str, int], str] = {}
+        for peer in peers or []:
+            self.add_peer(peer)
+        self._closed = threading.Event()
+
+    @property
+    def address(self) -> str:
+        host, port = self.sock.getsockname()
+        return f"{host}:{port}"
+
+    def add_peer(self, peer: str) -> None:
+        host, port = peer.rsplit(":", 1)
+        # Datagrams arrive from an IP, so match on the resolved address
+        address = (socket.gethostbyname(host), int(port))
+        self.peer_addresses[peer] = address
+        self._peer_names[address] = peer
+
+    def register(self, node_id: str, handler: Handler) -> None:
+        threading.Thread(
+            target=self._receive, args=(handler,), name="crdt-udp", daemon=True
+        ).start()
+
+    def peers(self, node_id: str) -> list[str]:
+        return list(self.peer_addresses)
+
+    def send(self, sender: str, peer: str, delta: Delta) -> None:
+        for start in range(0, len(delta), UDP_DELTA_ENTRIES):
+            payload = json.dumps(delta[start : start + UDP_DELTA_ENTRIES])
+            self.sock.sendto(payload.encode(), self.peer_addresses[peer])
+
+    def _receive(self, handler: Handler) -> None:
+        while not self._closed.is_set():
+            try:
+                data, address = self.sock.recvfrom(65535)
+            except TimeoutError:
+                continue
+            except OSError:
+                return
+            sender = self._peer_names.get(address)
+            if sender is None:
+                logger.warning("Dropped gossip from unknown address %s:%s", *address)
+                continue
+            try:
+                delta = [
+                    (key, window, count)
+                    for key, window, count in json.loads(data)
+                    if isinstance(key, str)
+                    and type(window) is int
+                    and type(count) is int
+                    and count >= 0
+                ]
+                handler(sender, delta)
+            except Exception:
+                logger.exception("Dropped malformed gossip datagram")
+
+    def close(self) -> None:
+        self._closed.set()
+        self.sock.close()
+
+
+class CrdtRateLimiter:
+    """
+    Fixed-window limiter that admits locally and converges by gossip.
+
+    Each (key, window) pair is a G-counter. A node admits a request when
+    the merged total it currently knows is under the limit, so peers'
+    admissions it has not heard of yet are invisible. With N nodes, a
+    window can be over-admitted by at most the requests the other N-1
+    nodes admit within one gossip interval. Counters of past windows are
+    dropped as soon as a new window is seen, with or without gossip.
+    """
+
+    def __init__(
+        self,
+        node_id: str,
+        transport: Transport,
+        limit: int,
+        window: int,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.node_id = node_id
+        self.transport = transport
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.counters: dict[tuple[str, int], GCounter] = {}
+        self._dirty: set[tuple[str, int]] = set()
+        self._window = 0
+        self._lock = threading.Lock()
+        transport.register(node_id, self.receive)
+
+    def _advance(self, current: int) -> None:
+        """Forget every window before `current`. Caller holds the lock."""
+        if current == self._window:
+            return
+        for slot in [slot for slot in self.counters if slot[1] < current]:
+            del self.counters[slot]
+        self._dirty = {slot for slot in self._dirty if slot[1] >= current}
+        self._window = current
+
+    def allow(self, key: str) -> bool:
+        current = int(self.clock() // self.window)
+        slot = (key, current)
+        with self._lock:
+            self._advance(current)
+            counter = self.counters.get(slot)
+            if counter is None:
+                counter = self.counters[slot] = GCounter()
+            if counter.total >= self.limit:
+                return False
+            counter.increment(self.node_id)
+            self._dirty.add(slot)
+            return True
+
+    def count(self, key: str) -> int:
+        counter = self.counters.get((key, int(self.clock() // self.window)))
+        return counter.total if counter else 0
+
+    def retry_after(self) -> int:
+        return int(self.window - self.clock() % self.window) or 1
+
+    def sync(self) -> None:
+        """Send this node's counts changed since the last sync to every peer."""
+        current = int(self.clock() // self.window)
+        with self._lock:
+            self._advance(current)
+            delta = [
+                (key, window, self.counters[key, window].counts[self.node_id])
+                for key, window in self._dirty
+            ]
+            self._dirty.clear()
+        if delta:
+            for peer in self.transport.peers(self.node_id):
+                self.transport.send(self.node_id, peer, delta)
+
+    def receive(self, sender: str, delta: Delta) -> None:
+        current = int(self.clock() // self.window)
+        with self._lock:
+            self._advance(current)
+            for key, window, count in delta:
+                # Allow one window of clock skew, but never hold future slots
+                if not current <= window <= current + 1:
+                    continue
+                counter = self.counters.get((key, window))
+                if counter is None:
+                    counter = self.counters[key, window] = GCounter()
+                counter.merge(sender, count)
+
+
+def run_gossip(
+    limiter: CrdtRateLimiter,
+    stop: threading.Event,
+    interval: float = GOSSIP_INTERVAL_SECONDS,
+) -> None:
+    while not stop.wait(interval):
+        limiter.sync()
+
+
+def start_gossip(
+    limiter: CrdtRateLimiter,
+    stop: threading.Event,
+    interval: float = GOSSIP_INTERVAL_SECONDS,
+) -> threading.Thread:
+    thread = threading.Thread(
+        target=run_gossip,
+        args=(limiter, stop, interval),
+        name="rate-limit-gossip",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def create_crdt_limiter(limit: int, window: int) -> CrdtRateLimiter:
+    """
+    Build this node's limiter from settings: UDP gossip with CRDT_PEERS
+    when CRDT_BIND is set, otherwise a standalone in-process node.
+
+    Each gossiping process is its own node, named by its CRDT_BIND
+    address. Workers sharing one address would share one G-counter slot
+    and undercount, so a second process binding it fails loudly.
+    """
+    if not settings.CRDT_BIND:
+        return CrdtRateLimiter(
+            socket.gethostname(), InProcessTransport(), limit, window
+        )
+    try:
+        transport = UdpTransport(settings.CRDT_BIND, settings.CRDT_PEERS)
+    except OSError as exc:
+        if exc.errno != errno.EADDRINUSE:
+            raise
+        raise RuntimeError(
+            f"CRDT_BIND {settings.CRDT_BIND} is already in use. Gossip needs "
+            "one worker process per address: run a single worker, or give "
+            "each process its own CRDT_BIND."
+        ) from exc
+    return CrdtRateLimiter(settings.CRDT_BIND, transport, limit, window)
@@ -1,7 +1,16 @@
+from datetime import datetime
 from uuid import UUID, uuid4
 
 from passlib.context import CryptContext
-from sqlalchemy import String
+from sqlalchemy import (
+    Boolean,
+    CheckConstraint,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    false,
+)
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
@@ -13,6 +22,10 @@ class Base(DeclarativeBase):
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+def hash_password(raw_password: str) -> str:
+    return pwd_context.hash(raw_password)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -24,6 +37,11 @@ class User(Base):
     name: Mapped[str] = mapped_column(String(60))
     username: Mapped[str] = mapped_column(String(30), unique=True)
     hashed_password: Mapped[str] = mapped_column(String(128))
+    tenant: Mapped[str | None] = mapped_column(String(60), default=None)
+    plan: Mapped[str | None] = mapped_column(String(30), default=None)
+    is_admin: Mapped[bool] = mapped_column(
+        Boolean, default=False, server_default=false()
+    )
 
     @property
     def password(self) -> None:
@@ -31,7 +49,47 @@ class User(Base):
 
     @password.setter
     def password(self, raw_password: str) -> None:
-        self.hashed_password = pwd_context.hash(raw_password)
+        self.hashed_password = hash_password(raw_password)
 
     def verify_password(self, raw_password: str) -> bool:
         return pwd_context.verify(raw_password, self.hashed_password)
+
+
+class RateLimitOverride(Base):
+    """Request limit for a single user or for every user on a plan."""
+
+    __tablename__ = "rate_limit_overrides"
+    __table_args__ = (
+        CheckConstraint(
+            "(user_id IS NULL) <> (plan IS NULL)", name="override_user_xor_plan"
+        ),
+    )
+
+    id: Mapped[UUID] = mapped_column(
+        PGUUID(as_uuid=True),
+        primary_key=True,
+        default=uuid4,
+    )
+    user_id: Mapped[UUID | None] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), unique=True, default=None
+    )
+    plan: Mapped[str | None] = mapped_column(String(30), unique=True, default=None)
+    limit: Mapped[int] = mapped_column(Integer)
+    window_seconds: Mapped[int] = mapped_column(Integer)
+
+
+class RateLimitDecision(Base):
+    """Audit row for a rejected, near-limit or sampled allowed request."""
+
+    __tablename__ = "rate_limit_decisions"
+
+    id: Mapped[UUID] = mapped_column(
+        PGUUID(as_uuid=True),
+        primary_key=True,
+        default=uuid4,
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    key: Mapped[str] = mapped_column(String(200), index=True)
+    decision: Mapped[str] = mapped_column(String(16))
+    count: Mapped[int] = mapped_column(Integer)
+    limit: Mapped[int] = mapped_column(Integer)
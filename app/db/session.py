@@ -7,6 +7,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.config import settings
+from app.tracing import span, tracing_active
 
 # ---------------------------------------------------------------------------
 # Engine creation (runs ONCE at import time)
@@ -77,7 +78,13 @@ def session_scope(session_factory: sessionmaker) -> Generator[Session, Any]:
         # Begin a transaction:
         #   - commit on normal exit
         #   - rollback if exception propagates
-        with session.begin():
+        with span("session_begin"):
+            transaction = session.begin()
+            if tracing_active():
+                # begin() is lazy; check out the connection now so the
+                # span times the pool checkout rather than an empty call.
+                session.connection()
+        with transaction:
             # Yield the session to the caller (e.g., FastAPI endpoint)
             yield session
     except SQLAlchemyError:
@@ -94,3 +101,8 @@ def session_scope(session_factory: sessionmaker) -> Generator[Session, Any]:
 
 def get_session() -> Generator[Session, None]:
     yield from session_scope(SessionLocal)
+
+
+def get_session_factory() -> sessionmaker[Session]:
+    """For handlers that need short transactions of their own."""
+    return SessionLocal
@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+from array import array
+from collections.abc import Callable, Hashable
+
+SKETCH_WIDTH = 4096
+SKETCH_DEPTH = 4
+TOP_K = 20
+# Estimated hits per decay period above which a key is blocked locally
+HEAVY_HITTER_THRESHOLD = 2000
+DECAY_SECONDS = 10.0
+
+_MASK = (1 << 64) - 1
+
+
+class CountMinSketch:
+    """
+    Fixed-size frequency estimator. Estimates never undercount; they
+    overcount by at most ~e/width of the total with high probability.
+
+    Rows use multiplicative hashing with a per-row odd salt over the
+    key's builtin hash, and all counters live in one flat array, so
+    memory is width * depth counters however many keys are seen.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH):
+        if width & (width - 1):
+            raise ValueError("width must be a power of two")
+        self.width = width
+        self.depth = depth
+        self._shift = 64 - (width.bit_length() - 1)
+        self._salts = tuple(random.getrandbits(64) | 1 for _ in range(depth))
+        self.counters = array("Q", bytes(8 * width * depth))
+
+    def add(self, key: Hashable) -> int:
+        """Count one hit for `key` and return its new estimate."""
+        h = hash(key) & _MASK
+        counters = self.counters
+        estimate = _MASK
+        offset = 0
+        for salt in self._salts:
+            index = offset + (((h * salt) & _MASK) >> self._shift)
+            count = counters[index] + 1
+            counters[index] = count
+            estimate = min(estimate, count)
+            offset += self.width
+        return estimate
+
+    def estimate(self, key: Hashable) -> int:
+        h = hash(key) & _MASK
+        return min(
+            self.counters[row * self.width + (((h * salt) & _MASK) >> self._shift)]
+            for row, salt in enumerate(self._salts)
+        )
+
+    def halve(self) -> None:
+        counters = self.counters
+        for index in range(len(counters)):
+            counters[index] >>= 1
+
+
+class HeavyHitterDetector:
+    """
+    Per-worker heavy-hitter filter: a Count-Min sketch for estimates plus
+    a bounded top-K table of the worst offenders. Everything is halved
+    every `decay_seconds`, so estimates track recent traffic.
+    """
+
+    def __init__(
+        self,
+        threshold: int = HEAVY_HITTER_THRESHOLD,
+        width: int = SKETCH_WIDTH,
+        depth: int = SKETCH_DEPTH,
+        top_k: int = TOP_K,
+        decay_seconds: float = DECAY_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.sketch = CountMinSketch(width, depth)
+        self.top_k = top_k
+        self.decay_seconds = decay_seconds
+        self.clock = clock
+        self.top: dict[Hashable, int] = {}
+        self._top_min = 0
+        self._next_decay = clock() + decay_seconds
+        self._lock = threading.Lock()
+
+    def hit(self, key: Hashable) -> bool:
+        """Record a hit and return True if `key` is over the threshold."""
+        with self._lock:
+            if self.clock() >= self._next_decay:
+                self._decay()
+            estimate = self.sketch.add(key)
+            if estimate > self._top_min or key in self.top:
+                self._track(key, estimate)
+            return estimate > self.threshold
+
+    def _track(self, key: Hashable, estimate: int) -> None:
+        top = self.top
+        if key not in top and len(top) >= self.top_k:
+            del top[min(top, key=top.__getitem__)]
+        top[key] = estimate
+        if len(top) >= self.top_k:
+            self._top_min = min(top.values())
+
+    def _decay(self) -> None:
+        self.sketch.halve()
+        for key in self.top:
+            self.top[key] >>= 1
+        self._top_min >>= 1
+        self._next_decay = self.clock() + self.decay_seconds
+
+    def estimate(self, key: Hashable) -> int:
+        return self.sketch.estimate(key)
+
+    def offenders(self) -> list[tuple[Hashable, int]]:
+        with self._lock:
+            return sorted(self.top.items(), key=lambda item: item[1], reverse=True)
+
+
+heavy_hitters = HeavyHitterDetector()
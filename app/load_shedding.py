@@ -0,0 +1,168 @@
+import time
+from collections.abc import Callable, Iterable
+from contextvars import ContextVar
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+INITIAL_LIMIT = 20
+MIN_LIMIT = 1
+MAX_LIMIT = 500
+# Queueing delay tolerated over a route's baseline latency
+LATENCY_TARGET_SECONDS = 0.25
+BACKOFF_RATIO = 0.9
+# A route's baseline is its fastest latency over the last one to two windows
+BASELINE_WINDOW_SECONDS = 60.0
+
+# Seconds the current request was deliberately held, e.g. by the throttle
+# queue. None outside LoadSheddingMiddleware.
+held_seconds: ContextVar[list[float] | None] = ContextVar("held_seconds", default=None)
+
+
+def record_hold(seconds: float) -> None:
+    """Leave time a request spent waiting on purpose out of its latency."""
+    held = held_seconds.get()
+    if held is not None:
+        held.append(seconds)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD admission limit for the whole process.
+
+    Latency is judged per route against that route's baseline, so a
+    route that is slow by design (a bcrypt hash) is not congestion. Every
+    request within the latency target of its baseline while the limiter
+    is at least half used grows the limit by 1/limit, i.e. about one slot
+    per limit's worth of requests. A request queued longer than that
+    shrinks it by BACKOFF_RATIO, at most once per target interval so a
+    burst of slow responses counts as one congestion signal.
+
+    The limiter is only touched from the event loop, so it needs no lock.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = INITIAL_LIMIT,
+        min_limit: int = MIN_LIMIT,
+        max_limit: int = MAX_LIMIT,
+        latency_target: float = LATENCY_TARGET_SECONDS,
+        backoff_ratio: float = BACKOFF_RATIO,
+        baseline_window: float = BASELINE_WINDOW_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self.baseline_window = baseline_window
+        self.clock = clock
+        self.in_flight = 0
+        self.shed = 0
+        self._last_decrease = float("-inf")
+        # route -> (window, previous window's minimum, current minimum)
+        self._baselines: dict[str, tuple[int, float, float]] = {}
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            self.shed += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def baseline(self, route: str, latency: float) -> float:
+        """Fold `latency` into the route's windowed minimum and return it."""
+        window = int(self.clock() // self.baseline_window)
+        start, previous, current = self._baselines.get(
+            route, (window, latency, latency)
+        )
+        if window != start:
+            previous = current if window == start + 1 else latency
+            current = latency
+        current = min(current, latency)
+        self._baselines[route] = (window, previous, current)
+        return min(previous, current)
+
+    def release(self, latency: float | None, route: str = "") -> None:
+        """Free a slot. A `latency` of None leaves the limit untouched."""
+        self.in_flight -= 1
+        if latency is None:
+            return
+        if latency - self.baseline(route, latency) > self.latency_target:
+            now = self.clock()
+            if now - self._last_decrease >= self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+                self._last_decrease = now
+        elif self.in_flight + 1 >= self.limit / 2:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+adaptive_limiter = AdaptiveLimiter()
+
+
+class LoadSheddingMiddleware:
+    """
+    Reject requests over the adaptive limit with a 503 before routing, so
+    shed requests never reach dependencies such as `get_session`.
+
+    Client errors say nothing about server load and are left out of the
+    signal, as are `unmeasured_paths` whose latency depends on the size
+    of the request rather than on congestion. Both still hold a slot.
+    """
+
+    def __init__(
+        self,
+        app,
+        limiter: AdaptiveLimiter = adaptive_limiter,
+        unmeasured_paths: Iterable[str] = (),
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.unmeasured_paths = frozenset(unmeasured_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if not self.limiter.try_acquire():
+            response = JSONResponse(
+                {"detail": "Server overloaded"},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        held: list[float] = []
+        token = held_seconds.set(held)
+        status_code = None
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = self.limiter.clock()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            held_seconds.reset(token)
+            latency = None
+            measured = scope["path"] not in self.unmeasured_paths
+            if measured and (status_code is None or not 400 <= status_code < 500):
+                latency = self.limiter.clock() - start - sum(held)
+            self.limiter.release(latency, scope["path"])
+
+
+def render_metrics(limiter: AdaptiveLimiter = adaptive_limiter) -> str:
+    return (
+        "# TYPE adaptive_concurrency_limit gauge\n"
+        f"adaptive_concurrency_limit {limiter.limit}\n"
+        "# TYPE adaptive_in_flight_requests gauge\n"
+        f"adaptive_in_flight_requests {limiter.in_flight}\n"
+        "# TYPE adaptive_shed_requests_total counter\n"
+        f"adaptive_shed_requests_total {limiter.shed}\n"
+    )
@@ -1,19 +1,76 @@
+import threading
+from contextlib import asynccontextmanager
 from typing import Annotated
+from uuid import UUID
 
 from fastapi import Depends, FastAPI, Form, HTTPException, Request, status
-from sqlalchemy.orm import Session
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from redis import Redis
+from sqlalchemy.orm import Session, sessionmaker
 
+from app.audit import audit_log, start_audit_writer
+from app.bulk import bulk_create_users, shutdown_hash_pool
+from app.config import settings
+from app.crdt import start_gossip
 from app.db.models import User
-from app.db.session import get_session
+from app.db.session import SessionLocal, get_session, get_session_factory
+from app.heavy_hitters import heavy_hitters
+from app.load_shedding import LoadSheddingMiddleware, render_metrics
+from app.overrides import delete_override, save_override, start_override_listener
 from app.rate_limiting import (
     check_rate_limit,
+    check_weighted_rate_limit,
+    concurrency_guard_using_redis,
+    get_crdt_limiter,
+    get_redis_client,
+    quota_limits,
     rate_limit_guard,
     rate_limit_guard_using_redis,
+    throttled_rate_limit,
+    weighted_rate_limit,
 )
-from app.schema import FormData, UserCreate, UserRead
-from app.security import authenticate_user, get_current_user, get_token_service
+from app.schema import (
+    FormData,
+    RateLimitOverrideIn,
+    RateLimitOverrideRead,
+    UserBatchCreate,
+    UserCreate,
+    UserRead,
+)
+from app.security import (
+    authenticate_user,
+    get_current_admin,
+    get_current_user,
+    get_token_service,
+)
+from app.tracing import TracingMiddleware, span
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    stop = threading.Event()
+    start_override_listener(get_redis_client(), SessionLocal, stop)
+    audit_writer = start_audit_writer(SessionLocal, stop)
+    if settings.CRDT_BIND:
+        start_gossip(get_crdt_limiter(), stop)
+    yield
+    stop.set()
+    audit_writer.join()
+    shutdown_hash_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+if settings.ADAPTIVE_LOAD_SHEDDING:
+    # Batch latency grows with the batch, not with load
+    app.add_middleware(LoadSheddingMiddleware, unmeasured_paths=["/users/batch"])
+if settings.REQUEST_TRACING:
+    app.add_middleware(TracingMiddleware)
+
+# Relative cost of each limited route. Creating a user pays for a bcrypt
+# hash and an insert, which dwarfs a plain read. A batch pays the same per
+# user, since every user in it still costs one hash.
+CREATE_USER_COST = 1000
 
 
 @app.get("/")
@@ -21,6 +78,54 @@ def home():
     return {"hello": "world"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    return render_metrics() + audit_log.render_metrics()
+
+
+@app.get("/admin/heavy_hitters", include_in_schema=False)
+def list_heavy_hitters(
+    _: User = Depends(get_current_admin),
+) -> list[dict[str, str | int | bool]]:
+    return [
+        {
+            "key": str(key),
+            "estimate": estimate,
+            "blocked": estimate > heavy_hitters.threshold,
+        }
+        for key, estimate in heavy_hitters.offenders()
+    ]
+
+
+@app.put("/admin/rate_limit_overrides", include_in_schema=False)
+def put_rate_limit_override(
+    override_in: RateLimitOverrideIn,
+    session: Session = Depends(get_session),
+    _: User = Depends(get_current_admin),
+    redis: Redis = Depends(get_redis_client),
+) -> RateLimitOverrideRead:
+    override = save_override(session, redis, **override_in.model_dump())
+    return RateLimitOverrideRead.model_validate(override)
+
+
+@app.delete(
+    "/admin/rate_limit_overrides/{override_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    include_in_schema=False,
+)
+def remove_rate_limit_override(
+    override_id: UUID,
+    session: Session = Depends(get_session),
+    _: User = Depends(get_current_admin),
+    redis: Redis = Depends(get_redis_client),
+) -> None:
+    if not delete_override(session, redis, override_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Override not found",
+        )
+
+
 @app.post("/generate_token")
 def get_token(
     data: Annotated[FormData, Form()],
@@ -33,7 +138,11 @@ def get_token(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid Username or Password",
         )
-    token = token_service.encode({"sub": authenticated_user.username})
+    payload = {"sub": authenticated_user.username}
+    # Lets DB-free guards apply plan overrides; stale for at most one token
+    if authenticated_user.plan:
+        payload["plan"] = authenticated_user.plan
+    token = token_service.encode(payload)
     return token
 
 
@@ -44,8 +153,37 @@ def create_user(
     session: Session = Depends(get_session),
     _: None = Depends(rate_limit_guard_using_redis),
     # _: None = Depends(rate_limit_guard),
+    __: None = Depends(concurrency_guard_using_redis),
+    # __: None = Depends(concurrency_guard),
+    ___: None = Depends(weighted_rate_limit(CREATE_USER_COST)),
 ) -> UserRead:
-    user = User(**user_in.model_dump())
-    session.add(user)
-    session.flush()
+    with span("handler"):
+        user = User(**user_in.model_dump())
+        session.add(user)
+        session.flush()
     return user
+
+
+@app.post("/users/batch")
+def create_users_batch(
+    batch: UserBatchCreate,
+    # First, so a held request waits before a session or connection exists
+    _: None = Depends(throttled_rate_limit()),
+    session: Session = Depends(get_session),
+    session_factory: sessionmaker[Session] = Depends(get_session_factory),
+    __: None = Depends(concurrency_guard_using_redis),
+    user: User = Depends(get_current_user),
+    redis: Redis = Depends(get_redis_client),
+) -> StreamingResponse:
+    check_weighted_rate_limit(
+        redis, quota_limits(user), CREATE_USER_COST * len(batch.users)
+    )
+    # Done with the user lookup: hand its connection back to the pool
+    # rather than hold it idle in transaction through the hashing.
+    session.close()
+    with span("handler"):
+        results = bulk_create_users(session_factory, batch.users)
+    return StreamingResponse(
+        (result.model_dump_json() + "\n" for result in results),
+        media_type="application/x-ndjson",
+    )
@@ -0,0 +1,165 @@
+import logging
+import threading
+from uuid import UUID
+
+from redis import Redis, RedisError
+from sqlalchemy import Select, event
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db.models import RateLimitOverride, User
+
+logger = logging.getLogger(__name__)
+
+OVERRIDES_CHANNEL = "rate_limiting:overrides"
+RECONNECT_MIN_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30.0
+
+
+class OverrideResolver:
+    """
+    In-memory copy of the rate_limit_overrides table.
+
+    The whole table is loaded in one query and swapped in as a single
+    tuple, so `resolve` never touches the database and readers never see
+    a half-built snapshot.
+    """
+
+    def __init__(self):
+        self._snapshot: tuple[dict, dict, dict] = ({}, {}, {})
+
+    def load(self, session: Session) -> None:
+        by_user, by_username, by_plan = {}, {}, {}
+        stmt = Select(RateLimitOverride, User.username).outerjoin(
+            User, RateLimitOverride.user_id == User.id
+        )
+        for override, username in session.execute(stmt):
+            limits = (override.limit, override.window_seconds)
+            if override.user_id is not None:
+                by_user[override.user_id] = limits
+                by_username[username] = limits
+            else:
+                by_plan[override.plan] = limits
+        self._snapshot = (by_user, by_username, by_plan)
+
+    def resolve(self, user: User) -> tuple[int, int] | None:
+        """Return `(limit, window_seconds)` for the user, or None for the defaults."""
+        by_user, _, by_plan = self._snapshot
+        return by_user.get(user.id) or by_plan.get(user.plan)
+
+    def resolve_token(self, payload: dict) -> tuple[int, int] | None:
+        """`resolve` for guards that only have the token's `sub` and `plan`."""
+        _, by_username, by_plan = self._snapshot
+        return by_username.get(payload["sub"]) or by_plan.get(payload.get("plan"))
+
+
+override_resolver = OverrideResolver()
+
+
+def notify_overrides_changed(redis_client: Redis) -> None:
+    """Tell every worker to reload overrides. Call after committing a change."""
+    redis_client.publish(OVERRIDES_CHANNEL, "reload")
+
+
+def _announce_on_commit(session: Session, redis_client: Redis) -> None:
+    """Publish the change once the session's transaction commits, so workers
+    reload only when it is visible and never for a rolled back change."""
+
+    def publish(_session: Session) -> None:
+        try:
+            notify_overrides_changed(redis_client)
+        except RedisError:
+            # The change is committed; workers reload when they resubscribe
+            logger.exception("Failed to announce rate limit override change")
+
+    event.listen(session, "after_commit", publish, once=True)
+
+
+def save_override(
+    session: Session,
+    redis_client: Redis,
+    limit: int,
+    window_seconds: int,
+    user_id: UUID | None = None,
+    plan: str | None = None,
+) -> RateLimitOverride:
+    """Create or replace the override for a user or a plan. Every worker
+    applies it within a second of the session committing."""
+    stmt = Select(RateLimitOverride).where(
+        RateLimitOverride.user_id == user_id
+        if user_id is not None
+        else RateLimitOverride.plan == plan
+    )
+    override = session.execute(stmt).scalar_one_or_none()
+    if override is None:
+        override = RateLimitOverride(user_id=user_id, plan=plan)
+        session.add(override)
+    override.limit = limit
+    override.window_seconds = window_seconds
+    session.flush()
+    _announce_on_commit(session, redis_client)
+    return override
+
+
+def delete_override(session: Session, redis_client: Redis, override_id: UUID) -> bool:
+    """Delete an override, announced on commit. False if it did not exist."""
+    override = session.get(RateLimitOverride, override_id)
+    if override is None:
+        return False
+    session.delete(override)
+    session.flush()
+    _announce_on_commit(session, redis_client)
+    return True
+
+
+def reload_overrides(session_factory: sessionmaker, resolver: OverrideResolver) -> None:
+    try:
+        with session_factory() as session:
+            resolver.load(session)
+    except Exception:
+        logger.exception("Failed to reload rate limit overrides")
+
+
+def listen_for_override_changes(
+    redis_client: Redis,
+    session_factory: sessionmaker,
+    stop: threading.Event,
+    resolver: OverrideResolver = override_resolver,
+) -> None:
+    # Overrides must apply even while Redis is down, so load them first
+    reload_overrides(session_factory, resolver)
+    backoff = RECONNECT_MIN_SECONDS
+    while not stop.is_set():
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(OVERRIDES_CHANNEL)
+            # Anything published before the subscription took effect was
+            # missed, so reload once now that we are listening
+            reload_overrides(session_factory, resolver)
+            backoff = RECONNECT_MIN_SECONDS
+            while not stop.is_set():
+                if pubsub.get_message(timeout=0.5) is not None:
+                    reload_overrides(session_factory, resolver)
+        except RedisError:
+            logger.warning(
+                "Lost override invalidation channel, retrying in %.1fs", backoff
+            )
+            stop.wait(backoff)
+            backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
+        finally:
+            pubsub.close()
+
+
+def start_override_listener(
+    redis_client: Redis,
+    session_factory: sessionmaker,
+    stop: threading.Event,
+    resolver: OverrideResolver = override_resolver,
+) -> threading.Thread:
+    thread = threading.Thread(
+        target=listen_for_override_changes,
+        args=(redis_client, session_factory, stop, resolver),
+        name="rate-limit-overrides",
+        daemon=True,
+    )
+    thread.start()
+    return thread
@@ -1,16 +1,175 @@
+import asyncio
 import datetime
+import logging
+import threading
+import time
+import uuid
 from collections import defaultdict, deque
+from collections.abc import Generator
 
 from fastapi import Depends, HTTPException, Request, status
-from redis import Redis
+from redis import Redis, RedisError
+from redis.asyncio import Redis as AsyncRedis
+from redis.commands.core import AsyncScript, Script
 
+from app.audit import audit_log
+from app.crdt import CrdtRateLimiter, create_crdt_limiter
 from app.db.models import User
-from app.security import get_current_user
+from app.heavy_hitters import heavy_hitters
+from app.load_shedding import record_hold
+from app.overrides import override_resolver
+from app.security import get_current_user, get_token_payload
+from app.tracing import span
+
+logger = logging.getLogger(__name__)
 
 rate_limit_store = defaultdict(deque)
 ALLOWED_REQUESTS_PER_USER = 1
 WINDOW_SECONDS = 60
 
+# Weighted quotas, in cost units per WINDOW_SECONDS. A route's cost is
+# debited from every level at once; tenant is skipped for users without one.
+USER_QUOTA_UNITS = 10_000
+TENANT_QUOTA_UNITS = 100_000
+GLOBAL_QUOTA_UNITS = 1_000_000
+DEFAULT_ROUTE_COST = 1
+
+# All levels are checked first and only debited when every one has room,
+# so a request rejected at the tenant level does not burn user quota.
+# Returns 0 on success, otherwise the 1-based index of the exhausted key,
+# its remaining TTL and the units already used on it.
+WEIGHTED_LIMIT_LUA = b"""
+local cost = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+for i, key in ipairs(KEYS) do
+    local used = tonumber(redis.call('GET', key) or '0')
+    if used + cost > tonumber(ARGV[i + 2]) then
+        local ttl = redis.call('TTL', key)
+        if ttl < 0 then
+            ttl = window
+        end
+        return {i, ttl, used}
+    end
+end
+for _, key in ipairs(KEYS) do
+    if redis.call('INCRBY', key, cost) == cost then
+        redis.call('EXPIRE', key, window)
+    end
+end
+return 0
+"""
+WEIGHTED_LIMIT_SCRIPT = Script(None, WEIGHTED_LIMIT_LUA)
+ASYNC_WEIGHTED_LIMIT_SCRIPT = AsyncScript(None, WEIGHTED_LIMIT_LUA)
+
+# Throttle-and-queue: hold a request for up to MAX_THROTTLE_DELAY_SECONDS
+# rather than rejecting it, with at most MAX_QUEUED_PER_KEY waiting per key.
+MAX_THROTTLE_DELAY_SECONDS = 5.0
+MAX_QUEUED_PER_KEY = 10
+throttle_locks: dict[str, asyncio.Lock] = {}
+throttle_waiting: defaultdict[str, int] = defaultdict(int)
+
+crdt_limiter: CrdtRateLimiter | None = None
+
+concurrency_store: defaultdict[str, int] = defaultdict(int)
+concurrency_lock = threading.Lock()
+MAX_CONCURRENT_REQUESTS_PER_USER = 5
+LEASE_SECONDS = 30
+
+# Leases live in a sorted set scored by their expiry time. Expired members
+# are purged before counting, so a worker that dies mid-request can only
+# hold its slot until the lease runs out. Time comes from Redis so clock
+# skew between workers cannot shorten or stretch a lease.
+ACQUIRE_LEASE_SCRIPT = Script(
+    None,
+    b"""
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local ttl = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[3])
+-- Never shorten the key's TTL below a longer-lived lease
+if redis.call('TTL', KEYS[1]) < ttl then
+    redis.call('EXPIRE', KEYS[1], math.max(ttl, 1))
+end
+return 1
+""",
+)
+
+# Push a live lease's expiry forward. A lease that already expired is
+# left alone: its slot may have been handed to someone else.
+RENEW_LEASE_SCRIPT = Script(
+    None,
+    b"""
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local ttl = tonumber(ARGV[1])
+local expires = redis.call('ZSCORE', KEYS[1], ARGV[2])
+if not expires or tonumber(expires) <= now then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[2])
+-- Never shorten the key's TTL below a longer-lived lease
+if redis.call('TTL', KEYS[1]) < ttl then
+    redis.call('EXPIRE', KEYS[1], math.max(ttl, 1))
+end
+return 1
+""",
+)
+
+
+class LeaseRenewer:
+    """
+    Keeps leases of long-running requests alive.
+
+    A single daemon thread renews every held lease each third of its
+    lifetime, so a handler that outlives LEASE_SECONDS keeps its slot
+    while a crashed worker's leases still lapse.
+    """
+
+    def __init__(self, interval: float = LEASE_SECONDS / 3):
+        self.interval = interval
+        self.leases: dict[tuple[str, str], tuple[Redis, int]] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def add(
+        self, redis_client: Redis, key: str, lease_id: str, lease_seconds: int
+    ) -> None:
+        with self._lock:
+            self.leases[key, lease_id] = (redis_client, lease_seconds)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="lease-renewer", daemon=True
+                )
+                self._thread.start()
+
+    def discard(self, key: str, lease_id: str) -> None:
+        with self._lock:
+            self.leases.pop((key, lease_id), None)
+
+    def renew_all(self) -> None:
+        with self._lock:
+            leases = list(self.leases.items())
+        for (key, lease_id), (redis_client, lease_seconds) in leases:
+            try:
+                RENEW_LEASE_SCRIPT(
+                    keys=[key], args=[lease_seconds, lease_id], client=redis_client
+                )
+            except RedisError:
+                logger.exception("Failed to renew lease %s", key)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            self.renew_all()
+
+
+lease_renewer = LeaseRenewer()
+
 
 def rate_limit_guard(user: User = Depends(get_current_user)) -> None:
     now = int(datetime.datetime.now().timestamp())
@@ -48,10 +207,13 @@ def check_rate_limit(
     limit: int = ALLOWED_REQUESTS_PER_USER,
     window: int = WINDOW_SECONDS,
 ):
-    count = redis_client.incr(key)
+    with span("redis"):
+        count = redis_client.incr(key)
 
-    if count == 1:
-        redis_client.expire(key, window)
+        if count == 1:
+            redis_client.expire(key, window)
+
+    audit_log.record(key, count, limit)
 
     if count > limit:
         retry_after = redis_client.ttl(key)
@@ -62,10 +224,289 @@ def check_rate_limit(
         )
 
 
+def get_async_redis_client() -> AsyncRedis:
+    from app.redis import async_redis_client
+
+    return async_redis_client
+
+
+async def throttle_rate_limit(
+    redis_client: AsyncRedis,
+    key: str,
+    limit: int = ALLOWED_REQUESTS_PER_USER,
+    window: int = WINDOW_SECONDS,
+    max_delay: float = MAX_THROTTLE_DELAY_SECONDS,
+    max_queued: int = MAX_QUEUED_PER_KEY,
+) -> None:
+    """
+    Wait for a permit instead of failing, as long as it arrives within `max_delay`.
+
+    Waiters on a key queue behind an asyncio.Lock, which wakes them in
+    FIFO order. The delay is measured from arrival, so time spent queued
+    behind earlier waiters counts against it. Only the head of the queue
+    polls Redis, and a rejected attempt is not counted against the
+    window, so retries cost nothing. Ordering is per worker process;
+    across workers it is best effort.
+    """
+    if throttle_waiting[key] >= max_queued:
+        audit_log.record(key, throttle_waiting[key] + 1, max_queued, "queue_full")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many queued requests",
+            headers={"Retry-After": str(window)},
+        )
+    loop = asyncio.get_running_loop()
+    arrival = loop.time()
+    deadline = arrival + max_delay
+    throttle_waiting[key] += 1
+    lock = throttle_locks.setdefault(key, asyncio.Lock())
+    try:
+        try:
+            async with asyncio.timeout_at(deadline):
+                await lock.acquire()
+        except TimeoutError:
+            audit_log.record(key, throttle_waiting[key], max_queued, "queue_timeout")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, int(max_delay)))},
+            ) from None
+        try:
+            while result := await ASYNC_WEIGHTED_LIMIT_SCRIPT(
+                keys=[key], args=[1, window, limit], client=redis_client
+            ):
+                _, retry_after, used = result
+                if loop.time() + retry_after > deadline:
+                    audit_log.record(key, used + 1, limit)
+                    raise HTTPException(
+                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        detail="Too many requests",
+                        headers={"Retry-After": str(retry_after)},
+                    )
+                # TTL has one second resolution; never spin on a zero
+                await asyncio.sleep(max(retry_after, 0.05))
+        finally:
+            lock.release()
+    finally:
+        # Held on purpose, so not a congestion signal for load shedding
+        record_hold(loop.time() - arrival)
+        throttle_waiting[key] -= 1
+        if not throttle_waiting[key]:
+            del throttle_waiting[key]
+            del throttle_locks[key]
+
+
+def throttled_rate_limit(
+    max_delay: float = MAX_THROTTLE_DELAY_SECONDS,
+    max_queued: int = MAX_QUEUED_PER_KEY,
+):
+    """
+    Build an opt-in variant of `rate_limit_guard_using_redis` that delays
+    requests over the limit instead of rejecting them. Meant for internal
+    batch clients, for which a 429 only turns into a retry storm.
+
+    The guard keys on the token's `sub` and never touches the database, so
+    list it before `get_session` and a held request pins no connection.
+    """
+
+    async def guard(
+        request: Request,
+        _: None = Depends(block_heavy_hitter_ips),
+        payload: dict = Depends(get_token_payload),
+        redis: AsyncRedis = Depends(get_async_redis_client),
+    ) -> None:
+        block_heavy_hitter_users(payload["sub"])
+        key = f"throttle:user:{payload['sub']}:endpoint:{request.url.path}"
+        limit, window = override_resolver.resolve_token(payload) or (
+            ALLOWED_REQUESTS_PER_USER,
+            WINDOW_SECONDS,
+        )
+        await throttle_rate_limit(redis, key, limit, window, max_delay, max_queued)
+
+    return guard
+
+
+def reject_heavy_hitter(key: str, estimate: int) -> None:
+    audit_log.record(key, estimate, heavy_hitters.threshold, "heavy_hitter")
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests",
+        headers={"Retry-After": str(int(heavy_hitters.decay_seconds))},
+    )
+
+
+def block_heavy_hitter_ips(request: Request) -> None:
+    """
+    Reject abusive client IPs. Guards list this before the user so it runs
+    ahead of the JWT decode and user lookup in `get_current_user`.
+    """
+    # Keys are the raw host and username strings so the check builds no new keys
+    if request.client and heavy_hitters.hit(request.client.host):
+        host = request.client.host
+        reject_heavy_hitter(f"heavy_hitter:ip:{host}", heavy_hitters.estimate(host))
+
+
+def block_heavy_hitter_users(username: str) -> None:
+    if heavy_hitters.hit(username):
+        key = f"heavy_hitter:user:{username}"
+        reject_heavy_hitter(key, heavy_hitters.estimate(username))
+
+
+def get_crdt_limiter() -> CrdtRateLimiter:
+    global crdt_limiter
+    if crdt_limiter is None:
+        crdt_limiter = create_crdt_limiter(ALLOWED_REQUESTS_PER_USER, WINDOW_SECONDS)
+    return crdt_limiter
+
+
+def rate_limit_guard_using_crdt(
+    request: Request,
+    user: User = Depends(get_current_user),
+    limiter: CrdtRateLimiter = Depends(get_crdt_limiter),
+) -> None:
+    """
+    Redis-free variant of `rate_limit_guard_using_redis` for multi-site
+    deployments: admits against local CRDT state and gossips with peers.
+    """
+    key = f"rate_limiting:user:{user.id}:endpoint:{request.url.path}"
+    if not limiter.allow(key):
+        audit_log.record(key, limiter.count(key) + 1, limiter.limit)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(limiter.retry_after())},
+        )
+
+
 def rate_limit_guard_using_redis(
     request: Request,
+    _: None = Depends(block_heavy_hitter_ips),
     user: User = Depends(get_current_user),
     redis: Redis = Depends(get_redis_client),
 ) -> None:
+    block_heavy_hitter_users(user.username)
     key = f"rate_limiting:user:{user.id}:endpoint:{request.url.path}"
-    check_rate_limit(redis, key)
+    override = override_resolver.resolve(user)
+    if override:
+        limit, window = override
+        check_rate_limit(redis, key, limit, window)
+    else:
+        check_rate_limit(redis, key)
+
+
+def check_weighted_rate_limit(
+    redis_client: Redis,
+    limits: list[tuple[str, str, int]],
+    cost: int = DEFAULT_ROUTE_COST,
+    window: int = WINDOW_SECONDS,
+) -> None:
+    """
+    Debit `cost` units from every `(level, key, limit)` in a single round trip.
+
+    Either all keys are debited or none are. The first exhausted level
+    decides the 429 and its Retry-After.
+    """
+    keys = [key for _, key, _ in limits]
+    args = [cost, window, *(limit for _, _, limit in limits)]
+    with span("redis_quota"):
+        result = WEIGHTED_LIMIT_SCRIPT(keys=keys, args=args, client=redis_client)
+    if result:
+        index, retry_after, used = result
+        level, key, limit = limits[index - 1]
+        audit_log.record(key, used + cost, limit, "quota")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{level.capitalize()} quota exceeded",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def quota_limits(user: User) -> list[tuple[str, str, int]]:
+    limits = [("user", f"quota:user:{user.id}", USER_QUOTA_UNITS)]
+    if user.tenant:
+        limits.append(("tenant", f"quota:tenant:{user.tenant}", TENANT_QUOTA_UNITS))
+    limits.append(("global", "quota:global", GLOBAL_QUOTA_UNITS))
+    return limits
+
+
+def weighted_rate_limit(cost: int = DEFAULT_ROUTE_COST):
+    """
+    Build a dependency that charges `cost` units against the user, tenant
+    and global quotas. Routes declare their cost where they are defined.
+    """
+
+    def guard(
+        user: User = Depends(get_current_user),
+        redis: Redis = Depends(get_redis_client),
+    ) -> None:
+        check_weighted_rate_limit(redis, quota_limits(user), cost)
+
+    return guard
+
+
+def acquire_lease(
+    redis_client: Redis,
+    key: str,
+    lease_id: str,
+    limit: int = MAX_CONCURRENT_REQUESTS_PER_USER,
+    lease_seconds: int = LEASE_SECONDS,
+) -> None:
+    acquired = ACQUIRE_LEASE_SCRIPT(
+        keys=[key], args=[lease_seconds, limit, lease_id], client=redis_client
+    )
+    if not acquired:
+        audit_log.record(key, limit + 1, limit, "concurrency")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent requests",
+            headers={"Retry-After": "1"},
+        )
+    lease_renewer.add(redis_client, key, lease_id, lease_seconds)
+
+
+def release_lease(redis_client: Redis, key: str, lease_id: str) -> None:
+    lease_renewer.discard(key, lease_id)
+    redis_client.zrem(key, lease_id)
+
+
+def concurrency_guard_using_redis(
+    request: Request,
+    user: User = Depends(get_current_user),
+    redis: Redis = Depends(get_redis_client),
+) -> Generator[None]:
+    key = f"concurrency:user:{user.id}:endpoint:{request.url.path}"
+    lease_id = uuid.uuid4().hex
+    acquire_lease(redis, key, lease_id)
+    try:
+        yield
+    finally:
+        release_lease(redis, key, lease_id)
+
+
+def concurrency_guard(
+    request: Request,
+    user: User = Depends(get_current_user),
+) -> Generator[None]:
+    """In-process variant of `concurrency_guard_using_redis` for single-node setups."""
+    key = f"{user.username}:{request.url.path}"
+    with concurrency_lock:
+        if concurrency_store[key] >= MAX_CONCURRENT_REQUESTS_PER_USER:
+            audit_log.record(
+                key,
+                concurrency_store[key] + 1,
+                MAX_CONCURRENT_REQUESTS_PER_USER,
+                "concurrency",
+            )
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many concurrent requests",
+                headers={"Retry-After": "1"},
+            )
+        concurrency_store[key] += 1
+    try:
+        yield
+    finally:
+        with concurrency_lock:
+            concurrency_store[key] -= 1
+            if not concurrency_store[key]:
+                del concurrency_store[key]
@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio
 
 from app.config import settings
 
@@ -7,3 +8,9 @@ redis_client = redis.Redis(
     port=settings.REDIS_PORT,
     decode_responses=True,
 )
+
+async_redis_client = redis.asyncio.Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    decode_responses=True,
+)
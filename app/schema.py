@@ -1,7 +1,7 @@
-from typing import Annotated
+from typing import Annotated, Literal
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class UserCreate(BaseModel):
@@ -18,6 +18,46 @@ class UserRead(BaseModel):
     model_config = {"from_attributes": True}
 
 
+# Largest batch whose hashing cost still fits in one window of user quota,
+# USER_QUOTA_UNITS // CREATE_USER_COST
+MAX_BATCH_USERS = 10
+
+
+class UserBatchCreate(BaseModel):
+    users: Annotated[list[UserCreate], Field(min_length=1, max_length=MAX_BATCH_USERS)]
+
+
+class UserBatchResult(BaseModel):
+    username: str
+    status: Literal["created", "conflict"]
+    id: UUID | None = None
+
+
+class RateLimitOverrideIn(BaseModel):
+    """Limit for exactly one of a user or a plan."""
+
+    user_id: UUID | None = None
+    plan: Annotated[str | None, Field(max_length=30)] = None
+    limit: Annotated[int, Field(gt=0)]
+    window_seconds: Annotated[int, Field(gt=0)]
+
+    @model_validator(mode="after")
+    def check_target(self) -> "RateLimitOverrideIn":
+        if (self.user_id is None) == (self.plan is None):
+            raise ValueError("Set exactly one of user_id and plan")
+        return self
+
+
+class RateLimitOverrideRead(BaseModel):
+    id: UUID
+    user_id: UUID | None
+    plan: str | None
+    limit: int
+    window_seconds: int
+
+    model_config = {"from_attributes": True}
+
+
 class FormData(BaseModel):
     username: str
     password: str
@@ -8,6 +8,7 @@ from sqlalchemy import Select
 
 from app.db.models import User
 from app.db.session import get_session
+from app.tracing import span
 
 
 class JwtService:
@@ -55,28 +56,39 @@ def authenticate_user(data, session) -> User | None:
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/generate_token")
 
 
-def get_current_user(
+def get_token_payload(
     token: Annotated[str, Depends(oauth2_scheme)],
     token_service=Depends(get_token_service),
-    session=Depends(get_session),
-):
+) -> dict:
+    """
+    Verify the bearer token without touching the database. Guards that
+    must run before a session is opened key on the payload's `sub`.
+    """
     try:
-        payload = token_service.decode(token)
+        with span("jwt"):
+            payload = token_service.decode(token)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    username = payload.get("sub")
-    if not username:
+    if not payload.get("sub"):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    stmt = Select(User).where(User.username == username)
-    user = session.execute(stmt).scalar_one_or_none()
+    return payload
+
+
+def get_current_user(
+    payload: dict = Depends(get_token_payload),
+    session=Depends(get_session),
+):
+    stmt = Select(User).where(User.username == payload["sub"])
+    with span("user_lookup"):
+        user = session.execute(stmt).scalar_one_or_none()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -84,3 +96,12 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     return user
+
+
+def get_current_admin(user: User = Depends(get_current_user)) -> User:
+    if not user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return user
@@ -0,0 +1,218 @@
+import itertools
+import json
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from contextvars import Context, ContextVar
+from types import FrameType
+
+logger = logging.getLogger(__name__)
+
+# Profile one in PROFILE_SAMPLE_EVERY requests, if it runs longer than
+# SLOW_REQUEST_SECONDS, by sampling the stacks of the threads working on it
+# each PROFILE_INTERVAL_SECONDS until the request finishes.
+PROFILE_SAMPLE_EVERY = 100
+SLOW_REQUEST_SECONDS = 1.0
+PROFILE_INTERVAL_SECONDS = 0.01
+
+# None when tracing is off, so `span` costs one ContextVar lookup
+current_spans: ContextVar[list[tuple[str, float]] | None] = ContextVar(
+    "current_spans", default=None
+)
+# Threads known to work on the current request, with their open span depth:
+# the event loop thread running the middleware, and any thread in a span.
+current_threads: ContextVar[dict[int, int] | None] = ContextVar(
+    "current_threads", default=None
+)
+
+
+class _Span:
+    __slots__ = ("name", "spans", "start", "thread_id", "threads")
+
+    def __init__(
+        self, name: str, spans: list[tuple[str, float]], threads: dict[int, int]
+    ):
+        self.name = name
+        self.spans = spans
+        self.threads = threads
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        self.threads[self.thread_id] = self.threads.get(self.thread_id, 0) + 1
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.spans.append((self.name, time.perf_counter() - self.start))
+        depth = self.threads.pop(self.thread_id) - 1
+        if depth:
+            self.threads[self.thread_id] = depth
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str) -> _Span | _NoopSpan:
+    """Time a block of the current request. Does nothing unless tracing is on."""
+    spans = current_spans.get()
+    if spans is None:
+        return _NOOP_SPAN
+    return _Span(name, spans, current_threads.get())
+
+
+def tracing_active() -> bool:
+    return current_spans.get() is not None
+
+
+def server_timing(spans: list[tuple[str, float]]) -> str:
+    return ", ".join(f"{name};dur={duration * 1000:.2f}" for name, duration in spans)
+
+
+def log_profile(path: str, stacks: Counter) -> None:
+    logger.warning(
+        json.dumps(
+            {
+                "event": "slow_request_profile",
+                "path": path,
+                "stacks": [f"{stack} {count}" for stack, count in stacks.most_common()],
+            }
+        )
+    )
+
+
+def _runs_in_request(frame: FrameType | None, threads: dict[int, int]) -> bool:
+    """
+    Whether a thread is running work that was handed off from the request.
+    Thread pools (anyio's, which Starlette runs sync endpoints and
+    dependencies on) call it through `Context.run` with the copied request
+    context held in a local, and that context carries the request's
+    `threads` dict.
+    """
+    while frame is not None:
+        for value in frame.f_locals.values():
+            if isinstance(value, Context) and value.get(current_threads) is threads:
+                return True
+        frame = frame.f_back
+    return False
+
+
+def sample_stacks(
+    done: threading.Event,
+    threshold: float,
+    interval: float,
+    threads: dict[int, int],
+) -> Counter:
+    """
+    Collapsed stacks ("outer;inner count") of the threads serving the
+    request: those in `threads` and pool threads running its work, inside
+    a span or not.
+    """
+    stacks: Counter = Counter()
+    if done.wait(threshold):
+        return stacks
+    while not done.is_set():
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id not in threads and not _runs_in_request(frame, threads):
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_filename}:{code.co_name}")
+                frame = frame.f_back
+            stacks[";".join(reversed(names))] += 1
+        done.wait(interval)
+    return stacks
+
+
+class TracingMiddleware:
+    """
+    Collect `span` timings for each request and report them as a
+    Server-Timing header and one JSON log line. A sample of requests is
+    also watched by a stack sampler that reports them if they turn out
+    to be slow.
+    """
+
+    def __init__(
+        self,
+        app,
+        sample_every: int = PROFILE_SAMPLE_EVERY,
+        slow_threshold: float = SLOW_REQUEST_SECONDS,
+        profile_interval: float = PROFILE_INTERVAL_SECONDS,
+        profile_hook: Callable[[str, Counter], None] = log_profile,
+    ):
+        self.app = app
+        self.sample_every = sample_every
+        self.slow_threshold = slow_threshold
+        self.profile_interval = profile_interval
+        self.profile_hook = profile_hook
+        self._requests = itertools.count()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: list[tuple[str, float]] = []
+        # Async guards, validation and serialization run on this thread
+        threads: dict[int, int] = {threading.get_ident(): 1}
+        token = current_spans.set(spans)
+        threads_token = current_threads.set(threads)
+        start = time.perf_counter()
+        profiler = None
+        if next(self._requests) % self.sample_every == 0:
+            profiler = self._start_profiler(scope["path"], threads)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings = [*spans, ("total", time.perf_counter() - start)]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(timings).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_spans.reset(token)
+            current_threads.reset(threads_token)
+            if profiler is not None:
+                profiler.set()
+            logger.info(
+                json.dumps(
+                    {
+                        "event": "request_trace",
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "total_ms": round((time.perf_counter() - start) * 1000, 2),
+                        "spans": [
+                            {"name": name, "ms": round(duration * 1000, 2)}
+                            for name, duration in spans
+                        ],
+                    }
+                )
+            )
+
+    def _start_profiler(self, path: str, threads: dict[int, int]) -> threading.Event:
+        done = threading.Event()
+
+        def run():
+            stacks = sample_stacks(
+                done, self.slow_threshold, self.profile_interval, threads
+            )
+            if stacks:
+                self.profile_hook(path, stacks)
+
+        threading.Thread(target=run, name="request-profiler", daemon=True).start()
+        return done
@@ -0,0 +1,72 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Select, func
+
+from app.audit import AuditLog
+from app.db.models import RateLimitDecision
+from app.rate_limiting import check_weighted_rate_limit
+from tests.conftest import SessionLocal
+
+
+def test_decisions_are_classified_and_allowed_ones_sampled():
+    log = AuditLog(sample_rate=0.0)
+
+    log.record("k", count=1, limit=10)  # allowed, not sampled
+    log.record("k", count=1, limit=1)  # the only permit is not "near" the limit
+    log.record("k", count=8, limit=10)
+    log.record("k", count=11, limit=10)
+    log.record("k", count=6, limit=5, decision="concurrency")
+
+    assert [row["decision"] for row in log._buffer] == [
+        "near_limit",
+        "limited",
+        "concurrency",
+    ]
+
+
+def test_overflow_is_dropped_and_counted():
+    log = AuditLog(capacity=2)
+
+    for _ in range(5):
+        log.record("k", count=2, limit=1)
+
+    assert len(log) == 2
+    assert log.dropped == 3
+
+
+def test_flush_writes_buffer_in_bulk(create_db, get_session_test):
+    log = AuditLog()
+    for i in range(5):
+        log.record(f"audit:flush:{i}", count=2, limit=1)
+
+    assert log.flush(SessionLocal, batch_size=3) == 3
+    assert log.flush(SessionLocal, batch_size=3) == 2
+    assert len(log) == 0
+
+    stmt = Select(func.count()).where(RateLimitDecision.key.like("audit:flush:%"))
+    assert get_session_test.execute(stmt).scalar_one() == 5
+
+
+def test_rejected_request_is_buffered(authenticated_test_client, monkeypatch):
+    log = AuditLog(sample_rate=0.0)
+    monkeypatch.setattr("app.rate_limiting.audit_log", log)
+
+    for i in range(2):
+        authenticated_test_client.post(
+            "/users",
+            json={"name": "n", "username": f"audited_{i}", "password": "secret123"},
+        )
+
+    assert [row["decision"] for row in log._buffer] == ["limited"]
+
+
+def test_quota_rejection_is_buffered(fake_redis, monkeypatch):
+    log = AuditLog()
+    monkeypatch.setattr("app.rate_limiting.audit_log", log)
+    fake_redis.set("quota:user:1", 9)
+
+    with pytest.raises(HTTPException):
+        check_weighted_rate_limit(fake_redis, [("user", "quota:user:1", 10)], cost=5)
+
+    (row,) = log._buffer
+    assert (row["key"], row["decision"], row["count"]) == ("quota:user:1", "quota", 14)
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.rate_limiting import (
+    acquire_lease,
+    concurrency_guard,
+    concurrency_store,
+    lease_renewer,
+    release_lease,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_leaked_leases():
+    yield
+    # Leases left behind would be renewed for the rest of the session
+    assert not lease_renewer.leases
+
+
+def test_lease_limit_and_release(fake_redis):
+    key = "concurrency:user:1:endpoint:/users"
+    acquire_lease(fake_redis, key, "a", limit=2)
+    acquire_lease(fake_redis, key, "b", limit=2)
+
+    with pytest.raises(HTTPException) as exc:
+        acquire_lease(fake_redis, key, "c", limit=2)
+    assert exc.value.status_code == 429
+
+    # Completing a request frees its slot
+    release_lease(fake_redis, key, "a")
+    acquire_lease(fake_redis, key, "c", limit=2)
+
+    release_lease(fake_redis, key, "b")
+    release_lease(fake_redis, key, "c")
+
+
+def test_expired_lease_does_not_leak_slot(fake_redis):
+    key = "concurrency:user:1:endpoint:/users"
+    # A lease that is never released, e.g. the worker crashed mid-request
+    acquire_lease(fake_redis, key, "crashed", limit=1, lease_seconds=0)
+
+    acquire_lease(fake_redis, key, "next", limit=1)
+    assert fake_redis.zrange(key, 0, -1) == ["next"]
+
+    release_lease(fake_redis, key, "crashed")
+    release_lease(fake_redis, key, "next")
+
+
+def test_in_process_concurrency_guard(monkeypatch):
+    monkeypatch.setattr("app.rate_limiting.MAX_CONCURRENT_REQUESTS_PER_USER", 1)
+    request = SimpleNamespace(url=SimpleNamespace(path="/users"))
+    user = SimpleNamespace(username="alice")
+
+    first = concurrency_guard(request, user)
+    next(first)
+
+    with pytest.raises(HTTPException) as exc:
+        next(concurrency_guard(request, user))
+    assert exc.value.status_code == 429
+
+    first.close()
+    assert "alice:/users" not in concurrency_store
+
+
+def test_renewal_extends_live_leases_only(fake_redis):
+    key = "concurrency:user:1:endpoint:/users/batch"
+    acquire_lease(fake_redis, key, "live", limit=2, lease_seconds=30)
+    acquire_lease(fake_redis, key, "expired", limit=2, lease_seconds=0)
+    # Pretend the live lease is about to run out
+    fake_redis.zadd(key, {"live": fake_redis.zscore(key, "live") - 29})
+
+    lease_renewer.renew_all()
+
+    assert fake_redis.zscore(key, "live") - fake_redis.time()[0] > 25
+    assert fake_redis.zscore(key, "expired") <= fake_redis.time()[0] + 1
+
+    release_lease(fake_redis, key, "live")
+    release_lease(fake_redis, key, "expired")
@@ -0,0 +1,149 @@
+import json
+import random
+import socket
+import time
+
+import pytest
+
+from app.config import settings
+from app.crdt import (
+    CrdtRateLimiter,
+    GCounter,
+    InProcessTransport,
+    UdpTransport,
+    create_crdt_limiter,
+)
+
+
+def test_gcounter_merge_is_idempotent():
+    counter = GCounter()
+    counter.increment("a", 3)
+    counter.merge("b", 2)
+    counter.merge("b", 2)
+    counter.merge("b", 1)  # stale delta
+
+    assert counter.total == 5
+
+
+def simulate(nodes: int, limit: int, requests: int, sync_every: int) -> int:
+    """
+    Send `requests` for one key through randomly chosen nodes within a
+    single window, gossiping every `sync_every` requests, and return how
+    many were admitted in total.
+    """
+    transport = InProcessTransport()
+    cluster = [
+        # A fixed clock keeps every request in the same window
+        CrdtRateLimiter(f"node-{i}", transport, limit, window=60, clock=lambda: 0.0)
+        for i in range(nodes)
+    ]
+    rng = random.Random(42)
+    admitted = 0
+    for i in range(requests):
+        admitted += rng.choice(cluster).allow("user:1")
+        if (i + 1) % sync_every == 0:
+            for node in cluster:
+                node.sync()
+    return admitted
+
+
+def test_single_node_is_exact():
+    assert simulate(nodes=1, limit=100, requests=1000, sync_every=50) == 100
+
+
+def test_over_admission_is_bounded_by_sync_interval():
+    limit = 130
+    for sync_every in (1, 10, 50, 100):
+        admitted = simulate(nodes=3, limit=limit, requests=1000, sync_every=sync_every)
+        # Never under-admits, and the error is bounded by the requests the
+        # other nodes can see between two syncs
+        assert limit <= admitted <= limit + sync_every
+
+
+def test_accuracy_improves_with_faster_sync():
+    slow = simulate(nodes=5, limit=130, requests=2000, sync_every=100)
+    fast = simulate(nodes=5, limit=130, requests=2000, sync_every=5)
+
+    assert fast == 130
+    assert slow > fast
+
+
+def test_old_windows_are_dropped_without_gossip(fake_clock):
+    limiter = CrdtRateLimiter(
+        "a", InProcessTransport(), limit=1, window=60, clock=fake_clock
+    )
+    for window in range(1000):
+        fake_clock.now = window * 60
+        assert limiter.allow("k")
+        assert not limiter.allow("k")
+
+    assert list(limiter.counters) == [("k", 999)]
+
+
+def test_nodes_converge_over_udp():
+    transports = [UdpTransport("127.0.0.1:0"), UdpTransport("127.0.0.1:0")]
+    transports[0].add_peer(transports[1].address)
+    transports[1].add_peer(transports[0].address)
+    a, b = (CrdtRateLimiter(t.address, t, limit=5, window=60) for t in transports)
+    try:
+        for _ in range(3):
+            assert a.allow("user:1")
+        a.sync()
+
+        deadline = time.monotonic() + 1
+        while b.count("user:1") < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert b.count("user:1") == 3
+        assert b.allow("user:1") and b.allow("user:1")
+        assert not b.allow("user:1")
+    finally:
+        for transport in transports:
+            transport.close()
+
+
+def test_udp_gossip_is_only_accepted_from_peers():
+    peer, node = UdpTransport("127.0.0.1:0"), UdpTransport("127.0.0.1:0")
+    node.add_peer(peer.address)
+    peer.add_peer(node.address)
+    limiter = CrdtRateLimiter(node.address, node, limit=5, window=60)
+    outsider = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    current = int(time.time() // 60)
+    try:
+        # Names a sender in the payload, but comes from an unlisted address
+        payload = json.dumps(["mallory", [["user:victim", current, 10**9]]])
+        host, port = node.address.rsplit(":", 1)
+        outsider.sendto(payload.encode(), (host, int(port)))
+        peer.send(peer.address, node.address, [("user:ok", current, 2)])
+
+        deadline = time.monotonic() + 1
+        while limiter.count("user:ok") < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert limiter.count("user:ok") == 2
+        assert limiter.count("user:victim") == 0
+        assert limiter.allow("user:victim")
+    finally:
+        outsider.close()
+        peer.close()
+        node.close()
+
+
+def test_future_windows_are_not_stored():
+    limiter = CrdtRateLimiter("a", InProcessTransport(), limit=5, window=60)
+    current = int(time.time() // 60)
+
+    limiter.receive("b", [("k", current + 1, 1), ("k", 10**12, 1)])
+
+    assert ("k", current + 1) in limiter.counters
+    assert ("k", 10**12) not in limiter.counters
+
+
+def test_second_worker_on_one_address_fails_loudly(monkeypatch):
+    first = UdpTransport("127.0.0.1:0")
+    monkeypatch.setattr(settings, "CRDT_BIND", first.address)
+    try:
+        with pytest.raises(RuntimeError, match="one worker process per address"):
+            create_crdt_limiter(limit=5, window=60)
+    finally:
+        first.close()
@@ -0,0 +1,77 @@
+from app.heavy_hitters import CountMinSketch, HeavyHitterDetector, heavy_hitters
+from app.rate_limiting import get_redis_client
+
+
+def test_sketch_never_undercounts():
+    sketch = CountMinSketch(width=64, depth=4)
+    for i in range(1000):
+        sketch.add(f"key-{i % 100}")
+
+    # Each key was added 10 times, so the next add is at least the 11th
+    assert all(sketch.add(f"key-{i}") >= 11 for i in range(100))
+
+
+def test_memory_is_fixed_regardless_of_key_count():
+    detector = HeavyHitterDetector(width=64, depth=4, top_k=5)
+    size = len(detector.sketch.counters)
+
+    for i in range(10_000):
+        detector.hit(f"key-{i}")
+
+    assert len(detector.sketch.counters) == size
+    assert len(detector.top) <= 5
+
+
+def test_heavy_key_is_flagged_and_tracked():
+    detector = HeavyHitterDetector(threshold=50, top_k=3)
+
+    for i in range(500):
+        detector.hit(f"light-{i}")
+        flagged = detector.hit("abuser")
+
+    assert flagged
+    assert not detector.hit("light-0")
+    assert detector.offenders()[0][0] == "abuser"
+
+
+def test_counts_decay_over_time(fake_clock):
+    detector = HeavyHitterDetector(threshold=50, decay_seconds=10, clock=fake_clock)
+    for _ in range(60):
+        detector.hit("burst")
+    assert detector.hit("burst")
+
+    fake_clock.now += 10
+
+    assert not detector.hit("burst")
+
+
+def test_heavy_hitter_ip_is_blocked_before_auth(test_client, fake_redis, monkeypatch):
+    monkeypatch.setattr(heavy_hitters, "threshold", 0)
+    test_client.app.dependency_overrides[get_redis_client] = lambda: fake_redis
+
+    # No token at all: the IP check answers before authentication is tried
+    response = test_client.post(
+        "/users",
+        json={"name": "n", "username": "blocked_user", "password": "secret123"},
+    )
+
+    assert response.status_code == 429
+    assert fake_redis.keys("rate_limiting:*") == []
+
+
+def test_heavy_hitters_listing_is_admin_only(
+    authenticated_test_client, test_user, monkeypatch
+):
+    monkeypatch.setattr(heavy_hitters, "threshold", 0)
+    authenticated_test_client.post(
+        "/users",
+        json={"name": "n", "username": "listed_user", "password": "secret123"},
+    )
+
+    response = authenticated_test_client.get("/admin/heavy_hitters")
+    assert response.status_code == 403
+
+    test_user.is_admin = True
+    offenders = authenticated_test_client.get("/admin/heavy_hitters").json()
+    blocked = {item["key"] for item in offenders if item["blocked"]}
+    assert "testclient" in blocked
@@ -0,0 +1,106 @@
+from fastapi.testclient import TestClient
+
+from app.load_shedding import AdaptiveLimiter, LoadSheddingMiddleware, record_hold
+from app.main import app
+from tests.conftest import FakeClock
+
+
+def simulate(limiter: AdaptiveLimiter, clock: FakeClock, capacity: int, steps: int):
+    """
+    Drive the limiter with clients that always have more work than it admits.
+
+    Latency is injected from a simple queueing model: requests finish in
+    `base` seconds while in-flight stays within `capacity`, and slow down
+    proportionally once the server is oversubscribed.
+    """
+    base = 0.1
+    history = []
+    for _ in range(steps):
+        admitted = 0
+        while limiter.try_acquire():
+            admitted += 1
+        latency = base * max(1.0, admitted / capacity)
+        for _ in range(admitted):
+            limiter.release(latency)
+        clock.now += latency
+        history.append(limiter.limit)
+    return history
+
+
+def test_limit_converges_to_capacity(fake_clock):
+    limiter = AdaptiveLimiter(initial_limit=5, latency_target=0.01, clock=fake_clock)
+
+    history = simulate(limiter, fake_clock, capacity=40, steps=300)
+
+    settled = history[-100:]
+    assert 0.8 * 40 <= min(settled)
+    assert max(settled) <= 1.2 * 40
+
+
+def test_limit_backs_off_when_capacity_drops(fake_clock):
+    limiter = AdaptiveLimiter(initial_limit=5, latency_target=0.01, clock=fake_clock)
+    simulate(limiter, fake_clock, capacity=40, steps=300)
+
+    history = simulate(limiter, fake_clock, capacity=10, steps=100)
+
+    assert max(history[-30:]) <= 1.2 * 10
+
+
+def test_requests_over_limit_are_shed_with_503():
+    limiter = AdaptiveLimiter(initial_limit=1)
+    client = TestClient(LoadSheddingMiddleware(app, limiter))
+
+    assert client.get("/").status_code == 200
+
+    limiter.in_flight = int(limiter.limit)  # every slot is taken
+    response = client.get("/")
+
+    assert response.status_code == 503
+    assert limiter.shed == 1
+
+
+def test_slow_by_design_routes_are_not_congestion(fake_clock):
+    limiter = AdaptiveLimiter(initial_limit=20, clock=fake_clock)
+
+    # Fast reads mixed with a bcrypt-bound create every 0.3s
+    for step in range(1000):
+        fake_clock.now = step * 0.01
+        assert limiter.try_acquire()
+        limiter.release(0.01, "/")
+        if step % 30 == 0:
+            assert limiter.try_acquire()
+            limiter.release(0.38, "/users")
+
+    assert limiter.limit == 20
+
+    # Queueing on top of the slow route's own baseline is still congestion
+    assert limiter.try_acquire()
+    limiter.release(0.38 + 1.0, "/users")
+    assert limiter.limit < 20
+
+
+def test_held_and_unmeasured_requests_are_not_congestion(fake_clock):
+    limiter = AdaptiveLimiter(initial_limit=20, clock=fake_clock)
+
+    async def app(scope, receive, send):
+        fake_clock.now += 5.0
+        if scope["path"] == "/held":
+            # e.g. waiting in the throttle queue
+            record_hold(5.0)
+        status = 429 if scope["path"] == "/rejected" else 200
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    client = TestClient(
+        LoadSheddingMiddleware(app, limiter, unmeasured_paths=["/batch"])
+    )
+    for path in ("/held", "/batch", "/rejected", "/slow"):
+        limiter.baseline(path, 0.01)
+
+    for path in ("/held", "/batch", "/rejected"):
+        client.get(path)
+    assert limiter.limit == 20
+    assert limiter.in_flight == 0
+
+    client.get("/slow")
+    assert limiter.limit < 20
@@ -0,0 +1,161 @@
+import threading
+import time
+
+import fakeredis
+from sqlalchemy import Select
+
+from app.db.models import RateLimitOverride
+from app.db.session import get_session, session_scope
+from app.overrides import (
+    OVERRIDES_CHANNEL,
+    OverrideResolver,
+    notify_overrides_changed,
+    override_resolver,
+    start_override_listener,
+)
+from tests.conftest import SessionLocal, UserFactory
+
+
+def add_override(**kwargs) -> None:
+    with SessionLocal() as session, session.begin():
+        session.add(RateLimitOverride(**kwargs))
+
+
+def test_user_override_wins_over_plan(create_db, get_session_test):
+    user = UserFactory.create(plan="gold-precedence")
+    other = UserFactory.create(plan="gold-precedence")
+    add_override(plan="gold-precedence", limit=50, window_seconds=60)
+    add_override(user_id=user.id, limit=5, window_seconds=10)
+
+    resolver = OverrideResolver()
+    resolver.load(get_session_test)
+
+    assert resolver.resolve(user) == (5, 10)
+    assert resolver.resolve(other) == (50, 60)
+    assert resolver.resolve(UserFactory.build()) is None
+    # Guards that run before the user lookup resolve from the token alone
+    assert resolver.resolve_token({"sub": user.username}) == (5, 10)
+    payload = {"sub": other.username, "plan": "gold-precedence"}
+    assert resolver.resolve_token(payload) == (50, 60)
+
+
+def wait_for(predicate, timeout: float = 1.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_change_is_picked_up_through_pubsub(create_db, fake_redis):
+    user = UserFactory.create()
+    add_override(user_id=user.id, limit=7, window_seconds=30)
+    resolver = OverrideResolver()
+    stop = threading.Event()
+    thread = start_override_listener(fake_redis, SessionLocal, stop, resolver)
+    try:
+        assert wait_for(lambda: resolver.resolve(user) == (7, 30))
+
+        with SessionLocal() as session, session.begin():
+            stmt = Select(RateLimitOverride).where(RateLimitOverride.user_id == user.id)
+            override = session.execute(stmt).scalar_one()
+            override.limit = 3
+        notify_overrides_changed(fake_redis)
+
+        assert wait_for(lambda: resolver.resolve(user) == (3, 30))
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_listener_survives_redis_outage(create_db, monkeypatch):
+    monkeypatch.setattr("app.overrides.RECONNECT_MIN_SECONDS", 0.01)
+    server = fakeredis.FakeServer()
+    server.connected = False
+    redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    user = UserFactory.create()
+    add_override(user_id=user.id, limit=4, window_seconds=30)
+    resolver = OverrideResolver()
+    stop = threading.Event()
+    thread = start_override_listener(redis, SessionLocal, stop, resolver)
+    try:
+        # Overrides load even though Redis is unreachable at startup
+        assert wait_for(lambda: resolver.resolve(user) == (4, 30))
+
+        with SessionLocal() as session, session.begin():
+            stmt = Select(RateLimitOverride).where(RateLimitOverride.user_id == user.id)
+            session.execute(stmt).scalar_one().limit = 9
+        server.connected = True
+
+        # The change made during the outage is picked up on reconnect
+        assert wait_for(lambda: resolver.resolve(user) == (9, 30))
+        assert thread.is_alive()
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_guard_uses_override(
+    authenticated_test_client, test_user, get_session_test, monkeypatch
+):
+    add_override(user_id=test_user.id, limit=2, window_seconds=60)
+    monkeypatch.setattr(override_resolver, "_snapshot", ({}, {}))
+    override_resolver.load(get_session_test)
+
+    for i in range(2):
+        response = authenticated_test_client.post(
+            "/users",
+            json={"name": "n", "username": f"override_{i}", "password": "secret123"},
+        )
+        assert response.status_code == 201, response.json()
+
+
+def test_admin_write_is_committed_then_announced(
+    authenticated_test_client, test_user, fake_redis
+):
+    # A session per request, committed when the request ends, as in production
+    authenticated_test_client.app.dependency_overrides[get_session] = lambda: (
+        yield from session_scope(SessionLocal)
+    )
+    user = UserFactory.create()
+    resolver = OverrideResolver()
+    stop = threading.Event()
+    thread = start_override_listener(fake_redis, SessionLocal, stop, resolver)
+    try:
+        assert wait_for(lambda: fake_redis.pubsub_numsub(OVERRIDES_CHANNEL)[0][1])
+        body = {"user_id": str(user.id), "limit": 6, "window_seconds": 20}
+
+        response = authenticated_test_client.put(
+            "/admin/rate_limit_overrides", json=body
+        )
+        assert response.status_code == 403
+
+        test_user.is_admin = True
+        response = authenticated_test_client.put(
+            "/admin/rate_limit_overrides", json=body
+        )
+        assert response.status_code == 200, response.text
+        assert wait_for(lambda: resolver.resolve(user) == (6, 20))
+
+        response = authenticated_test_client.put(
+            "/admin/rate_limit_overrides", json={**body, "limit": 2}
+        )
+        override_id = response.json()["id"]
+        assert wait_for(lambda: resolver.resolve(user) == (2, 20))
+
+        response = authenticated_test_client.delete(
+            f"/admin/rate_limit_overrides/{override_id}"
+        )
+        assert response.status_code == 204
+        assert wait_for(lambda: resolver.resolve(user) is None)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_override_must_target_user_or_plan(authenticated_test_client, test_user):
+    test_user.is_admin = True
+    response = authenticated_test_client.put(
+        "/admin/rate_limit_overrides", json={"limit": 1, "window_seconds": 1}
+    )
+
+    assert response.status_code == 422
@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+from fastapi import HTTPException
+
+from app.db.session import get_session
+from app.load_shedding import held_seconds
+from app.rate_limiting import throttle_locks, throttle_rate_limit
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_request_over_limit_is_delayed_not_rejected():
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    held: list[float] = []
+
+    async def scenario():
+        held_seconds.set(held)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await throttle_rate_limit(redis, "k", limit=1, window=1)
+        await throttle_rate_limit(redis, "k", limit=1, window=1)
+        return loop.time() - start
+
+    assert run(scenario()) >= 0.9
+    assert throttle_locks == {}
+    # The wait is reported so load shedding does not read it as congestion
+    assert sum(held) >= 0.9
+
+
+def test_request_is_rejected_when_wait_exceeds_max_delay():
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async def scenario():
+        await throttle_rate_limit(redis, "k", limit=1, window=60)
+        await throttle_rate_limit(redis, "k", limit=1, window=60, max_delay=1)
+
+    with pytest.raises(HTTPException) as exc:
+        run(scenario())
+    assert exc.value.status_code == 429
+
+
+def test_waiters_are_admitted_in_fifo_order():
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    admitted = []
+
+    async def client(name):
+        await throttle_rate_limit(redis, "k", limit=1, window=1)
+        admitted.append(name)
+
+    async def scenario():
+        await client("first")
+        tasks = [asyncio.create_task(client(name)) for name in ("second", "third")]
+        await asyncio.gather(*tasks)
+
+    run(scenario())
+    assert admitted == ["first", "second", "third"]
+
+
+def test_queue_is_bounded_per_key():
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    async def scenario():
+        await throttle_rate_limit(redis, "k", limit=1, window=1)
+        waiting = asyncio.create_task(
+            throttle_rate_limit(redis, "k", limit=1, window=1, max_queued=1)
+        )
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc:
+            await throttle_rate_limit(redis, "k", limit=1, window=1, max_queued=1)
+        await waiting
+        return exc.value
+
+    assert run(scenario()).detail == "Too many queued requests"
+
+
+def test_time_spent_queued_counts_towards_max_delay():
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    outcomes = []
+
+    async def client():
+        try:
+            await throttle_rate_limit(redis, "k", limit=1, window=1, max_delay=1.5)
+            outcomes.append("admitted")
+        except HTTPException:
+            outcomes.append("rejected")
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(client() for _ in range(5)))
+        return loop.time() - start
+
+    elapsed = run(scenario())
+
+    assert outcomes.count("admitted") == 2
+    assert elapsed < 2
+
+
+def test_batch_route_is_throttled(authenticated_test_client, fake_async_redis):
+    batch = {"users": [{"name": "n", "username": "t_0", "password": "secret123"}]}
+    assert authenticated_test_client.post("/users/batch", json=batch).status_code == 200
+
+    # Window is WINDOW_SECONDS, well past the default max delay, so reject
+    response = authenticated_test_client.post("/users/batch", json=batch)
+
+    assert response.status_code == 429
+    assert response.json()["detail"] == "Too many requests"
+    assert run(fake_async_redis.keys("throttle:*"))
+
+
+def test_batch_request_waits_before_opening_a_session(
+    authenticated_test_client, get_session_test, monkeypatch
+):
+    monkeypatch.setattr("app.rate_limiting.WINDOW_SECONDS", 1)
+    opened = []
+
+    def recording_session():
+        opened.append(time.monotonic())
+        yield get_session_test
+
+    authenticated_test_client.app.dependency_overrides[get_session] = recording_session
+    batch = {"users": [{"name": "n", "username": "w_0", "password": "secret123"}]}
+    assert authenticated_test_client.post("/users/batch", json=batch).status_code == 200
+
+    batch = {"users": [{"name": "n", "username": "w_1", "password": "secret123"}]}
+    start = time.monotonic()
+    response = authenticated_test_client.post("/users/batch", json=batch)
+
+    assert response.status_code == 200, response.text
+    # Held for the rest of the window with no session, hence no connection
+    assert opened[-1] - start >= 0.5
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import Counter
+
+from fastapi.testclient import TestClient
+from starlette.concurrency import run_in_threadpool
+
+from app.main import app
+from app.rate_limiting import get_redis_client
+from app.tracing import TracingMiddleware, current_spans, span
+
+
+def span_names(response) -> list[str]:
+    header = response.headers["server-timing"]
+    return [entry.split(";")[0] for entry in header.split(", ")]
+
+
+def test_server_timing_covers_hot_path(test_client, auth_headers, fake_redis):
+    test_client.app.dependency_overrides[get_redis_client] = lambda: fake_redis
+    client = TestClient(TracingMiddleware(app, sample_every=10**9))
+
+    response = client.post(
+        "/users",
+        json={"name": "Traced", "username": "traced_user", "password": "secret123"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 201, response.json()
+    names = span_names(response)
+    for name in ("jwt", "user_lookup", "redis", "redis_quota", "handler", "total"):
+        assert name in names
+
+
+def test_no_header_or_spans_when_tracing_is_off(test_client):
+    response = test_client.get("/")
+
+    assert "server-timing" not in response.headers
+    assert current_spans.get() is None
+    with span("ignored"):
+        pass
+
+
+def unrelated_worker(stop: threading.Event) -> None:
+    stop.wait()
+
+
+def profile(app) -> Counter:
+    """Run one sampled request through `app` and return its profile."""
+    profiles = []
+    middleware = TracingMiddleware(
+        app,
+        sample_every=1,
+        slow_threshold=0.02,
+        profile_hook=lambda path, stacks: profiles.append((path, stacks)),
+    )
+    stop = threading.Event()
+    unrelated = threading.Thread(target=unrelated_worker, args=(stop,))
+    unrelated.start()
+    try:
+        response = TestClient(middleware).get("/slow")
+    finally:
+        stop.set()
+        unrelated.join()
+
+    assert response.status_code == 200
+    for _ in range(100):
+        if profiles:
+            break
+        time.sleep(0.01)
+    path, stacks = profiles[0]
+    assert path == "/slow"
+    # Threads that are not serving the request are never sampled
+    assert not any("unrelated_worker" in stack for stack in stacks)
+    return stacks
+
+
+async def respond(send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def test_slow_sampled_request_is_profiled():
+    def slow_handler():
+        with span("work"):
+            time.sleep(0.1)
+
+    async def slow_app(scope, receive, send):
+        # Like a sync endpoint, the work runs on a worker thread
+        await run_in_threadpool(slow_handler)
+        await respond(send)
+
+    stacks = profile(slow_app)
+
+    assert any("slow_handler" in stack for stack in stacks)
+
+
+def test_slow_work_outside_spans_is_profiled():
+    def slow_dependency():
+        time.sleep(0.1)
+
+    def slow_serialization():
+        time.sleep(0.1)
+
+    async def slow_app(scope, receive, send):
+        # No span anywhere: a sync dependency on the pool, then blocking
+        # work on the event loop thread
+        await run_in_threadpool(slow_dependency)
+        slow_serialization()
+        await respond(send)
+
+    stacks = profile(slow_app)
+
+    assert any("slow_dependency" in stack for stack in stacks)
+    assert any("slow_serialization" in stack for stack in stacks)
@@ -0,0 +1,103 @@
+import json
+
+from sqlalchemy import Select
+
+from app.bulk import hash_passwords
+from app.db.models import User
+from app.main import CREATE_USER_COST
+from app.rate_limiting import USER_QUOTA_UNITS
+from app.schema import MAX_BATCH_USERS
+from tests.conftest import SessionLocal, UserFactory
+
+
+def test_user_batch_create(authenticated_test_client, create_db, get_session_test):
+    """
+    Verify bulk user creation via the POST /users/batch endpoint.
+
+    This test ensures that:
+    - New users are created and their ids returned
+    - Existing usernames and repeats within the batch are reported as conflicts
+    - One NDJSON result is streamed per submitted user, in order
+    - Passwords hashed on the process pool still verify
+    """
+    existing = UserFactory.create()
+    response = authenticated_test_client.post(
+        "/users/batch",
+        json={
+            "users": [
+                {"name": "A", "username": "batch_a", "password": "secret123"},
+                {"name": "B", "username": existing.username, "password": "secret123"},
+                {"name": "C", "username": "batch_c", "password": "secret123"},
+                {"name": "A2", "username": "batch_a", "password": "secret123"},
+            ]
+        },
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r["username"], r["status"]) for r in results] == [
+        ("batch_a", "created"),
+        (existing.username, "conflict"),
+        ("batch_c", "created"),
+        ("batch_a", "conflict"),
+    ]
+
+    stmt = Select(User).where(User.username == "batch_a")
+    with SessionLocal() as session:
+        user = session.execute(stmt).scalar_one()
+    assert str(user.id) == results[0]["id"]
+    assert user.verify_password("secret123")
+
+
+def test_no_transaction_is_open_while_hashing(
+    authenticated_test_client, get_session_test, monkeypatch
+):
+    open_during_hashing = []
+
+    def recording_hash_passwords(passwords):
+        open_during_hashing.append(get_session_test.in_transaction())
+        return hash_passwords(passwords)
+
+    monkeypatch.setattr("app.bulk.hash_passwords", recording_hash_passwords)
+    batch = {"users": [{"name": "n", "username": "idle_a", "password": "secret123"}]}
+
+    response = authenticated_test_client.post("/users/batch", json=batch)
+
+    assert response.status_code == 200, response.text
+    assert open_during_hashing == [False]
+
+
+def test_user_batch_is_charged_per_user(
+    authenticated_test_client, create_db, fake_redis, test_user
+):
+    # Leave room for two users' worth of hashing in the user quota
+    fake_redis.set(
+        f"quota:user:{test_user.id}", USER_QUOTA_UNITS - 2 * CREATE_USER_COST
+    )
+    users = [
+        {"name": "n", "username": f"heavy_{i}", "password": "secret123"}
+        for i in range(3)
+    ]
+
+    response = authenticated_test_client.post("/users/batch", json={"users": users})
+
+    assert response.status_code == 429
+    assert response.json()["detail"] == "User quota exceeded"
+
+    # The rejected batch is not debited
+    assert int(fake_redis.get(f"quota:user:{test_user.id}")) == (
+        USER_QUOTA_UNITS - 2 * CREATE_USER_COST
+    )
+
+
+def test_largest_batch_fits_user_quota(authenticated_test_client, create_db):
+    assert MAX_BATCH_USERS * CREATE_USER_COST <= USER_QUOTA_UNITS
+
+    users = [
+        {"name": "n", "username": f"big_{i}", "password": "secret123"}
+        for i in range(MAX_BATCH_USERS + 1)
+    ]
+    response = authenticated_test_client.post("/users/batch", json={"users": users})
+
+    assert response.status_code == 422
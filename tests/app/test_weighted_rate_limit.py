@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.rate_limiting import check_weighted_rate_limit, quota_limits
+
+LIMITS = [
+    ("user", "quota:user:1", 10),
+    ("tenant", "quota:tenant:acme", 100),
+    ("global", "quota:global", 1000),
+]
+
+
+def test_cost_is_debited_from_every_level(fake_redis):
+    check_weighted_rate_limit(fake_redis, LIMITS, cost=4)
+    check_weighted_rate_limit(fake_redis, LIMITS, cost=4)
+
+    assert [fake_redis.get(key) for _, key, _ in LIMITS] == ["8", "8", "8"]
+    assert fake_redis.ttl("quota:user:1") > 0
+
+
+def test_exhausted_level_rejects_without_debiting(fake_redis):
+    fake_redis.set("quota:tenant:acme", 98, ex=30)
+
+    with pytest.raises(HTTPException) as exc:
+        check_weighted_rate_limit(fake_redis, LIMITS, cost=5)
+
+    assert exc.value.status_code == 429
+    # Clients learn which level ran out, not the internal key
+    assert exc.value.detail == "Tenant quota exceeded"
+    assert int(exc.value.headers["Retry-After"]) <= 30
+    # Nothing was charged, not even the levels that had room
+    assert fake_redis.get("quota:user:1") is None
+    assert fake_redis.get("quota:tenant:acme") == "98"
+
+
+def test_quota_limits_skip_missing_tenant():
+    user = SimpleNamespace(id=1, tenant=None)
+
+    levels = [level for level, _, _ in quota_limits(user)]
+
+    assert levels == ["user", "global"]
@@ -20,10 +20,10 @@ from sqlalchemy import StaticPool, create_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.db.models import Base, User
-from app.db.session import get_session, session_scope
+from app.db.session import get_session, get_session_factory, session_scope
 from app.main import app
-from app.rate_limiting import get_redis_client
-from app.security import get_current_user
+from app.rate_limiting import get_async_redis_client, get_redis_client
+from app.security import get_current_user, get_token_payload
 
 # ---------------------------------------------------------------------------
 # Test database configuration
@@ -139,6 +139,7 @@ def test_client(get_session_test) -> Generator[TestClient, None, None]:
         yield get_session_test
 
     client.app.dependency_overrides[get_session] = override_get_session
+    client.app.dependency_overrides[get_session_factory] = lambda: SessionLocal
 
     yield client
 
@@ -161,14 +162,34 @@ def auth_headers(test_user, test_client):
     return {"Authorization": f"Bearer {access_token}"}
 
 
+class FakeClock:
+    """Settable stand-in for `time.monotonic` and friends."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def fake_clock() -> FakeClock:
+    return FakeClock()
+
+
 @pytest.fixture
 def fake_redis():
     return fakeredis.FakeRedis(decode_responses=True)
 
 
+@pytest.fixture
+def fake_async_redis():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
 @pytest.fixture(scope="function")
 def authenticated_test_client(
-    get_session_test, test_user, test_client, fake_redis
+    get_session_test, test_user, test_client, fake_redis, fake_async_redis
 ) -> Generator[TestClient, None, None]:
     def override_get_current_user():
         # test_user here overrides the get_cuurent_user so auth part is never called
@@ -178,7 +199,13 @@ def authenticated_test_client(
         yield fake_redis
 
     test_client.app.dependency_overrides[get_current_user] = override_get_current_user
+    test_client.app.dependency_overrides[get_token_payload] = lambda: {
+        "sub": test_user.username
+    }
     test_client.app.dependency_overrides[get_redis_client] = override_get_redis_client
+    test_client.app.dependency_overrides[get_async_redis_client] = lambda: (
+        fake_async_redis
+    )
 
     yield test_client
 
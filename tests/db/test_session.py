@@ -3,7 +3,8 @@ from unittest.mock import MagicMock, patch
 from sqlalchemy import Select
 
 from app.db.models import User
-from app.db.session import get_session
+from app.db.session import get_session, session_scope
+from app.tracing import current_spans, current_threads
 from tests.conftest import UserFactory
 
 
@@ -54,6 +55,27 @@ def test_get_session_exception_path() -> None:
         mock_session.close.assert_called_once()
 
 
+def test_session_begin_span_checks_out_connection() -> None:
+    """
+    With tracing on, the session_begin span should cover the connection
+    checkout, since session.begin() alone does not touch the pool.
+    """
+    mock_session = MagicMock()
+    spans: list[tuple[str, float]] = []
+    token = current_spans.set(spans)
+    threads_token = current_threads.set({})
+    try:
+        gen = session_scope(MagicMock(return_value=mock_session))
+        next(gen)
+        gen.close()
+    finally:
+        current_spans.reset(token)
+        current_threads.reset(threads_token)
+
+    mock_session.connection.assert_called_once()
+    assert [name for name, _ in spans] == ["session_begin"]
+
+
 def test_user_creation(engine, create_db, get_session_test) -> None:
     """
     Verify that a User can be: